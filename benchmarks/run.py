@@ -0,0 +1,144 @@
+"""Times the labeling, radiance and tiling steps on synthetic scenes.
+
+Each benchmark runs --repeat times. The best run gives the throughput in
+megapixels per second, the largest run gives the peak of memory allocated from
+Python and numpy (tracemalloc, GDAL's own buffers are not included). Results
+can be saved as a baseline and later runs compared against it: a benchmark
+that is slower or uses more memory than the baseline by more than --tolerance
+is a regression and the run exits with status 1. Baselines depend on the
+machine, so they are not part of the repository.
+
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import numpy as np
+import rasterio
+
+from auto_label import (
+    NDVI_THRESHOLD, NDWI_THRESHOLD, NDBI_THRESHOLD,
+    calculate_ndvi, calculate_ndwi, calculate_ndbi, threshold_image, percentage_calculate,
+    create_multiclass_mask, process_image,
+)
+from rad_calc import process_tiff
+from raster_io import read_scaled
+from splitter import split_tif
+from synthetic import make_scene, write_mtl
+
+TOLERANCE_DEFAULT = 0.2
+# peak memory below this many MB is never a regression, small allocations are noisy
+MEMORY_SLACK_MB = 4
+
+
+def measure(function, repeat):
+    """Runs function repeat times, returns (best seconds, peak MB). Its output is silenced."""
+    best, peak = float("inf"), 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best, peak / 1e6
+
+
+def benchmarks(work_dir, size, blocksize, nodata):
+    """(name, function) pairs, with the scenes they read written to work_dir."""
+    dn_path = make_scene(os.path.join(work_dir, "dn.tif"), size, size, "uint16", blocksize, nodata)
+    rad_path = make_scene(os.path.join(work_dir, "rad.tif"), size, size, "float32", blocksize, nodata)
+    mtl_path = write_mtl(os.path.join(work_dir, "dn_MTL.json"))
+    out_dir = os.path.join(work_dir, "out")
+    os.makedirs(out_dir, exist_ok=True)
+
+    with rasterio.open(rad_path) as src:
+        image = read_scaled(src)
+    ndvi, ndwi, ndbi = calculate_ndvi(image), calculate_ndwi(image), calculate_ndbi(image)
+    normalized = [percentage_calculate(threshold_image(index, t))
+                  for index, t in ((ndvi, NDVI_THRESHOLD), (ndwi, NDWI_THRESHOLD), (ndbi, NDBI_THRESHOLD))]
+
+    def split():
+        shutil.rmtree(os.path.join(out_dir, "tiles"), ignore_errors=True)
+        split_tif(rad_path, os.path.join(out_dir, "tiles"), 512, 512, "tif")
+
+    return [
+        ("calculate_ndvi", lambda: calculate_ndvi(image)),
+        ("calculate_ndwi", lambda: calculate_ndwi(image)),
+        ("calculate_ndbi", lambda: calculate_ndbi(image)),
+        ("threshold_image", lambda: threshold_image(ndvi, NDVI_THRESHOLD)),
+        ("create_multiclass_mask", lambda: create_multiclass_mask(*normalized)),
+        ("process_image", lambda: process_image(rad_path, out_dir, NDVI_THRESHOLD, NDWI_THRESHOLD, NDBI_THRESHOLD, save_format="tif")),
+        ("process_tiff", lambda: process_tiff(mtl_path, dn_path, os.path.join(out_dir, "rad.tif"))),
+        ("split_tif", split),
+    ]
+
+
+def run(size, blocksize, nodata, repeat, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, function in benchmarks(work_dir, size, blocksize, nodata):
+            if only and name not in only:
+                continue
+            seconds, peak_mb = measure(function, repeat)
+            results[name] = {"seconds": seconds, "mpix_per_second": size * size / 1e6 / seconds, "peak_mb": peak_mb}
+            print(f"{name:<24} {results[name]['mpix_per_second']:>10.1f} MPix/s {peak_mb:>10.1f} MB  ({seconds:.3f}s)")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages for results that are worse than the baseline by more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result["mpix_per_second"] < base["mpix_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['mpix_per_second']:.1f} MPix/s, baseline {base['mpix_per_second']:.1f} MPix/s")
+        if result["peak_mb"] > max(base["peak_mb"] * (1 + tolerance), base["peak_mb"] + MEMORY_SLACK_MB):
+            regressions.append(f"{name}: {result['peak_mb']:.1f} MB peak, baseline {base['peak_mb']:.1f} MB")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the processing steps on synthetic Landsat 8 like scenes.")
+    parser.add_argument("--size", type=int, default=2048, help="Width and height of the synthetic scenes (default: 2048).")
+    parser.add_argument("--blocksize", type=int, default=512, help="Internal tile size of the scenes, 0 for strips (default: 512).")
+    parser.add_argument("--nodata", choices=["none", "rotated"], default="none", help="Zero fill pattern of the scenes (default: none).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the best one counts (default: 3).")
+    parser.add_argument("--only", nargs="+", default=None, help="Run only these benchmarks.")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE_DEFAULT, help=f"Allowed slowdown or memory growth, as a fraction (default: {TOLERANCE_DEFAULT}).")
+    parser.add_argument("--save-baseline", default=None, help="Write the results to this baseline JSON.")
+    args = parser.parse_args()
+
+    config = dict(size=args.size, blocksize=args.blocksize, nodata=args.nodata)
+    results = run(args.size, args.blocksize, args.nodata, args.repeat, args.only)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"config": config, "numpy": np.__version__, "results": results}, f, indent=1)
+        print(f"✅ Saved baseline: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            sys.exit(f"❌ Baseline was measured with {baseline['config']}, this run used {config}.")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"❌ REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No regressions against {args.baseline}")
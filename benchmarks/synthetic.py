@@ -0,0 +1,130 @@
+"""Deterministic synthetic Landsat 8 like scenes for the benchmarks.
+
+A scene is a smooth land cover map (water, vegetation, bare soil, urban) with
+per class band reflectances and noise, written as a 7 band GeoTIFF of DN
+(uint16) or radiance (float32) values, together with an MTL JSON holding the
+radiance rescaling factors rad_calc.py reads. The same arguments always give
+the same pixels, whatever the block layout or compression.
+"""
+import argparse
+import json
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+BANDS = 7
+# rough Landsat 8 DN levels per class for bands 1-7
+CLASS_DN = np.array([
+    [9500, 9000, 8200, 7200, 6200, 5600, 5400],        # water
+    [9800, 9200, 9000, 8000, 19000, 13000, 9500],      # vegetation
+    [10500, 10200, 11000, 12500, 15000, 17500, 15500],  # bare soil
+    [11500, 11200, 12000, 13000, 14000, 17000, 16500],  # urban
+], dtype=np.float64)
+NOISE_DN = 250
+# land cover features are about this many pixels across
+FEATURE_SIZE = 96
+RADIANCE_MULT = [0.0123, 0.0126, 0.0116, 0.0098, 0.0060, 0.0015, 0.0005]
+RADIANCE_ADD = [-61.5, -63.0, -58.1, -49.0, -30.0, -7.5, -2.5]
+NODATA_PATTERNS = ["none", "rotated"]
+# rows generated per step, bounds memory for large scenes
+CHUNK_ROWS = 512
+
+
+def _smooth_field(rng, height, width):
+    """Coarse random grid, bilinearly sampled per window by _sample."""
+    return rng.random((height // FEATURE_SIZE + 2, width // FEATURE_SIZE + 2))
+
+
+def _sample(field, rows, cols):
+    r = rows / FEATURE_SIZE
+    c = cols / FEATURE_SIZE
+    r0, c0 = r.astype(int), c.astype(int)
+    tr, tc = (r - r0)[:, None], (c - c0)[None, :]
+    top = field[np.ix_(r0, c0)] * (1 - tc) + field[np.ix_(r0, c0 + 1)] * tc
+    bottom = field[np.ix_(r0 + 1, c0)] * (1 - tc) + field[np.ix_(r0 + 1, c0 + 1)] * tc
+    return top * (1 - tr) + bottom * tr
+
+
+def _footprint(rows, cols, height, width):
+    """Scene footprint rotated by about 12 degrees inside the raster, like a Landsat path/row."""
+    angle = np.deg2rad(12)
+    y = (rows[:, None] - height / 2) / (height / 2)
+    x = (cols[None, :] - width / 2) / (width / 2)
+    u = x * np.cos(angle) + y * np.sin(angle)
+    v = -x * np.sin(angle) + y * np.cos(angle)
+    return (np.abs(u) < 0.8) & (np.abs(v) < 0.8)
+
+
+def scene_window(seed, height, width, window, nodata="none", dtype="uint16"):
+    """The (bands, rows, cols) pixels of one window of the scene."""
+    rng = np.random.default_rng(seed)
+    cover, wetness = _smooth_field(rng, height, width), _smooth_field(rng, height, width)
+    rows = np.arange(window.row_off, window.row_off + window.height)
+    cols = np.arange(window.col_off, window.col_off + window.width)
+
+    # wet lowlands are water, the rest is split by the cover field
+    wet, land = _sample(wetness, rows, cols), _sample(cover, rows, cols)
+    classes = np.where(wet > 0.8, 0, np.where(land < 0.45, 1, np.where(land < 0.7, 2, 3)))
+    # noise is seeded by the window offset; make_scene always generates the same
+    # CHUNK_ROWS strips, so the pixels do not depend on the block layout
+    noise = np.random.default_rng([seed, window.row_off, window.col_off]).standard_normal((BANDS, len(rows), len(cols)))
+    dn = CLASS_DN[classes].transpose(2, 0, 1) + NOISE_DN * noise
+    dn = np.clip(dn, 1, 65535)
+    if nodata == "rotated":
+        dn[:, ~_footprint(rows, cols, height, width)] = 0
+
+    if dtype == "uint16":
+        return dn.astype(np.uint16)
+    radiance = np.empty(dn.shape, dtype=np.float32)
+    for band, (mult, add) in enumerate(zip(RADIANCE_MULT, RADIANCE_ADD)):
+        radiance[band] = np.where(dn[band] > 0, mult * dn[band].astype(np.uint16) + add, 0)
+    return radiance
+
+
+def write_mtl(path):
+    """MTL JSON with the radiance rescaling factors used for float32 scenes."""
+    rescaling = {}
+    for band, (mult, add) in enumerate(zip(RADIANCE_MULT, RADIANCE_ADD), start=1):
+        rescaling[f"RADIANCE_MULT_BAND_{band}"] = str(mult)
+        rescaling[f"RADIANCE_ADD_BAND_{band}"] = str(add)
+    with open(path, "w") as f:
+        json.dump({"LANDSAT_METADATA_FILE": {"LEVEL1_RADIOMETRIC_RESCALING": rescaling}}, f, indent=1)
+    return path
+
+
+def make_scene(path, width=2048, height=2048, dtype="uint16", blocksize=512, nodata="none", compress="none", seed=0):
+    """Writes a synthetic scene, blocksize 0 gives a striped GeoTIFF. Returns path."""
+    if nodata not in NODATA_PATTERNS:
+        raise ValueError(f"Unknown nodata pattern: {nodata}")
+    profile = dict(
+        driver="GTiff", width=width, height=height, count=BANDS, dtype=dtype,
+        crs="EPSG:32633", transform=from_origin(500000, 4500000, 30, 30),
+        nodata=0 if nodata != "none" else None, compress=compress,
+    )
+    if blocksize:
+        profile.update(tiled=True, blockxsize=blocksize, blockysize=blocksize)
+
+    with rasterio.open(path, "w", **profile) as dst:
+        for row in range(0, height, CHUNK_ROWS):
+            window = Window(0, row, width, min(CHUNK_ROWS, height - row))
+            dst.write(scene_window(seed, height, width, window, nodata, dtype), window=window)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic Landsat 8 like GeoTIFF and its MTL JSON.")
+    parser.add_argument("output", help="Path of the GeoTIFF to write, the MTL JSON is written next to it.")
+    parser.add_argument("--width", type=int, default=2048, help="Width in pixels (default: 2048).")
+    parser.add_argument("--height", type=int, default=2048, help="Height in pixels (default: 2048).")
+    parser.add_argument("--dtype", choices=["uint16", "float32"], default="uint16", help="DN (uint16) or radiance (float32) values (default: uint16).")
+    parser.add_argument("--blocksize", type=int, default=512, help="Internal tile size, 0 for strips (default: 512).")
+    parser.add_argument("--nodata", choices=NODATA_PATTERNS, default="none", help="Zero fill pattern (default: none).")
+    parser.add_argument("--compress", default="none", help="GeoTIFF compression (default: none).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    args = parser.parse_args()
+
+    make_scene(args.output, args.width, args.height, args.dtype, args.blocksize, args.nodata, args.compress, args.seed)
+    mtl = write_mtl(f"{os.path.splitext(args.output)[0]}_MTL.json")
+    print(f"✅ Saved: {args.output} and {mtl}")
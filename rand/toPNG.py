@@ -1,13 +1,18 @@
 import os
+import sys
 import rasterio
 import numpy as np
-from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from encoder import Encoder
 
 # Use current directory
 input_dir = os.getcwd()
 output_dir = os.path.join(input_dir, "output_png")
 os.makedirs(output_dir, exist_ok=True)
 
+# PNGs are compressed on a thread pool while the next file is read
+encoder = Encoder("png")
 for filename in os.listdir(input_dir):
     if filename.endswith(".tif") or filename.endswith(".tiff"):
         image_path = os.path.join(input_dir, filename)
@@ -25,8 +30,10 @@ for filename in os.listdir(input_dir):
 
                 # Save PNG
                 img_name = os.path.splitext(filename)[0] + ".png"
-                Image.fromarray(img).save(os.path.join(output_dir, img_name))
+                encoder.submit(img, os.path.join(output_dir, img_name))
 
                 print(f"✅ Converted {filename} to RGB PNG")
 
+encoder.close()
+encoder.report()
 print("🎯 Conversion complete! ✅")
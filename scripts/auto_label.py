@@ -1,11 +1,27 @@
 import rasterio
+from rasterio.windows import Window
 import numpy as np
-import cv2
 import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap
 import argparse
 import csv
 import os
+import traceback
+from contextlib import nullcontext
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+import instrument
+from manifest import MANIFEST_NAME, Manifest
+from mosaic import expand_inputs, open_mosaic
+from index_cache import CACHE_DTYPES, CACHE_SIZE_DEFAULT, IndexCache
+from encoder import PNG_LEVEL_DEFAULT, PNG_STRATEGIES, PNG_STRATEGY_DEFAULT
+from mask_io import CLASS_COLORMAP, MASK_FORMATS, write_mask
+from raster_io import BLOCKSIZE_DEFAULT, COMPRESS_DEFAULT, COMPRESSIONS, open_cog, read_scaled
+from sketch import QuantileSketch
+from rules import Rule, classify, load_rules
+from spectral import SENSOR_BANDS, SENSOR_DEFAULT, IndexPlan, compute_indices
 
 # Constants for the classes
 BACKGROUND = 0
@@ -19,87 +35,32 @@ NDWI_THRESHOLD = 0.85
 NDBI_THRESHOLD = 0.8
 
 
+# The index math lives in spectral.py, these compute a single index
 # Calculate NDVI
 def calculate_ndvi(image):
-    nir = image[4]
-    red = image[3]
-    ndvi = (nir - red) / (nir + red)  # NDVI formula
-    return ndvi
+    return compute_indices(image, ["ndvi"])["ndvi"]
 
 # Calculate NDWI
 def calculate_ndwi(image):
-    green = image[2]  # Band 3 (Green) → Index 2
-    swir = image[5]   # Band 6 (SWIR1) → Index 5
-    ndwi = (green - swir) / (green + swir)  # NDWI formula
-    return ndwi
-
+    return compute_indices(image, ["ndwi"])["ndwi"]
 
 # Calculate NDBI
 def calculate_ndbi(image):
-    swir = image[5]  # SWIR1 (Band 6, index 5)
-    nir = image[4]   # NIR (Band 5, index 4)
-    # Avoid division by zero by adding a small constant (epsilon)
-    epsilon = 1e-6  
-    ndbi = (swir - nir) / (swir + nir + epsilon)
-    return ndbi
+    return compute_indices(image, ["ndbi"])["ndbi"]
 
 def calculate_ui(image):
-    blue = image[1]   # Band 2
-    red = image[3]    # Band 4
-    nir = image[4]    # Band 5
-    swir1 = image[5]  # Band 6
-
-    epsilon = 1e-6  # To avoid division by zero
-
-    numerator = (swir1 + red) - (nir + blue)
-    denominator = (swir1 + red) + (nir + blue) + epsilon
-
-    ui = numerator / denominator
-    return ui
+    return compute_indices(image, ["ui"])["ui"]
 
 def calculate_ibi(image):
-    # Band indexes for Landsat 8
-    green = image[2]  # Band 3
-    red = image[3]    # Band 4
-    nir = image[4]    # Band 5
-    swir1 = image[5]  # Band 6
-
-    # Small constant to avoid division by zero
-    epsilon = 1e-6
-
-    # Step 1: Calculate NDBI
-    ndbi = (swir1 - nir) / (swir1 + nir + epsilon)
-
-    # Step 2: Calculate NDVI
-    ndvi = (nir - red) / (nir + red + epsilon)
+    return compute_indices(image, ["ibi"])["ibi"]
 
-    # Step 3: Calculate MNDWI
-    mndwi = (green - swir1) / (green + swir1 + epsilon)
-
-    # Step 4: Calculate IBI
-    ibi_numerator = ndbi - (ndvi + mndwi)
-    ibi_denominator = ndbi + (ndvi + mndwi) + epsilon
-
-    ibi = ibi_numerator / ibi_denominator
-
-    return ibi
-
-def save_image_tif(image, filename, src=None):
-    # Ensure the image has shape (1, height, width)
-    image = np.expand_dims(image, axis=0)  # Add band dimension
-
-    with rasterio.open(
-        filename, "w",
-        driver="GTiff",
-        height=image.shape[1],  # Height
-        width=image.shape[2],  # Width
-        count=1,  # Single band
-        dtype=image.dtype,
-        crs=src.crs,
-        transform=src.transform
-    ) as dst:
-        dst.write(image)  # Write as (bands, height, width)
+# Profile of a single band mask GeoTIFF on the grid of src
+def mask_profile(src, dtype=np.uint8):
+    return dict(height=src.height, width=src.width, count=1, dtype=dtype, crs=src.crs, transform=src.transform)
 
+def save_image_tif(image, filename, src=None, blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT):
+    # Cloud Optimized GeoTIFF with the class colors, class masks get mode overviews
+    write_mask(image, filename, src, blocksize, compress)
     print(f"✅ Saved as tif: {filename}")
 
 # show example of the images
@@ -118,17 +79,21 @@ def show_thresholded_images(ndvi_thresholded, ndwi_thresholded, ndbi_thresholded
     plt.colorbar()
     plt.show()
 
-def save_image_png(image, filename):
-    # Normalize to 0-255
-    image = ((image + 1) / 2 * 255).astype(np.uint8)
-    # Save as PNG
-    cv2.imwrite(filename, image)
+def save_image_png(image, filename, level=PNG_LEVEL_DEFAULT, strategy=PNG_STRATEGY_DEFAULT):
+    # Save the class values as a palette PNG, level and strategy tune the zlib compression
+    write_mask(image, filename, level=level, strategy=strategy)
     print(f"✅ Saved as png: {filename}")
 
+def save_image_npy(image, filename):
+    # Bit-packed classes, 2 bits per pixel for the 4 classes
+    write_mask(image, filename)
+    print(f"✅ Saved as npy: {filename}")
+
 
 # Thresholding (only show max 90% of the pixels)
 def threshold_image(image, threshold=0.8):
-    threshold_value = np.percentile(image, threshold * 100)
+    # the percentile comes from a sketch, same as the streaming path
+    threshold_value = image.dtype.type(QuantileSketch().update(image).quantile(threshold))
     min_value = image.min()  
     thresholded_image = np.where(image >= threshold_value, image, min_value)  
     
@@ -152,95 +117,374 @@ def visualize_multiclass_mask(mask):
     plt.colorbar(ticks=[0, 1, 2, 3], format=plt.FuncFormatter(lambda x, _: ["None", "Vegetation", "Water", "Urban"][int(x)]))
     plt.show()
  
-def create_multiclass_mask(ndvi, ndwi, ndbi, ndvi_t=NDVI_THRESHOLD, ndwi_t=NDWI_THRESHOLD, ndbi_t=NDBI_THRESHOLD):
-    mask = np.zeros_like(ndvi, dtype=np.uint8)  # Initialize with all zeros
-    
-    mask[ndvi > ndvi_t] = VEGETATION
-    mask[ndbi > ndbi_t] = URBAN
-    mask[ndwi > ndwi_t] = WATER
-    
-    # Ensure remaining pixels are set to BG
-    mask[(ndvi <= ndvi_t) & (ndwi <= ndwi_t) & (ndbi <= ndbi_t)] = BACKGROUND
-    return mask
-
-# the main processing function
-def process_image(image_path, output_dir, ndvi_t, ndwi_t, ndbi_t, save_format="png", image_number=1):
-    
-    # Open
-    with rasterio.open(image_path) as src:
-        image = src.read()
-
-    # Calculate NDVI, NDWI, and NDBI
-    ndvi = calculate_ndvi(image)
-    ndwi = calculate_ndwi(image)
-    ndbi = calculate_ndbi(image)
-
-    # Threshold the images
-    ndvi_thresholded = threshold_image(ndvi, ndvi_t)
-    ndwi_thresholded = threshold_image(ndwi, ndwi_t)
-    ndbi_thresholded = threshold_image(ndbi, ndbi_t)
-
-    # convert the images to percentage
-    ndvi_thresholded = percentage_calculate(ndvi_thresholded)
-    ndwi_thresholded = percentage_calculate(ndwi_thresholded)
-    ndbi_thresholded = percentage_calculate(ndbi_thresholded)
-
-    # create the multiclass mask
-    multiclass_mask = create_multiclass_mask(ndvi_thresholded, ndwi_thresholded, ndbi_thresholded, ndvi_t, ndwi_t, ndbi_t)
-    # Extract the base name of the input image and append "_mm"
+# The default rule table, the first matching rule wins: water over urban over vegetation
+def mask_rules(ndvi_t=NDVI_THRESHOLD, ndwi_t=NDWI_THRESHOLD, ndbi_t=NDBI_THRESHOLD):
+    return [
+        Rule(WATER, "ndwi", ">", ndwi_t),
+        Rule(URBAN, "ndbi", ">", ndbi_t),
+        Rule(VEGETATION, "ndvi", ">", ndvi_t),
+    ]
+
+# Pixels that match no rule stay BG, rules (see rules.py) may replace the default table
+def create_multiclass_mask(ndvi, ndwi, ndbi, ndvi_t=NDVI_THRESHOLD, ndwi_t=NDWI_THRESHOLD, ndbi_t=NDBI_THRESHOLD, rules=None):
+    rules = rules or mask_rules(ndvi_t, ndwi_t, ndbi_t)
+    return classify(dict(ndvi=ndvi, ndwi=ndwi, ndbi=ndbi), rules, BACKGROUND)
+
+# Iterate over windows covering the raster, the internal blocks by default; strips
+# (blocks as wide as the raster, often a single row) are joined to at least MIN_WINDOW_ROWS rows
+MIN_WINDOW_ROWS = 256
+
+def iter_windows(src, window_size=None):
+    if not window_size:
+        block_height, block_width = src.block_shapes[0]
+        if block_width < src.width or block_height >= MIN_WINDOW_ROWS:
+            for _, window in src.block_windows(1):
+                yield window
+            return
+        rows = -(-MIN_WINDOW_ROWS // block_height) * block_height
+        for row in range(0, src.height, rows):
+            yield Window(0, row, src.width, min(rows, src.height - row))
+        return
+    for row in range(0, src.height, window_size):
+        for col in range(0, src.width, window_size):
+            yield Window(col, row, min(window_size, src.width - col), min(window_size, src.height - row))
+
+# Calculate the three indices used by the multiclass mask in one fused pass
+MASK_INDEX_NAMES = ["ndvi", "ndwi", "ndbi"]
+
+@lru_cache(maxsize=None)
+def mask_plan(sensor=SENSOR_DEFAULT):
+    return IndexPlan(MASK_INDEX_NAMES, SENSOR_BANDS[sensor])
+
+# The 1-based bands the mask indices read and the plan over only those, see IndexPlan.compact
+@lru_cache(maxsize=None)
+def mask_reads(sensor=SENSOR_DEFAULT):
+    return mask_plan(sensor).compact()
+
+# From a cube of all bands of the sensor
+def calculate_indices(image, sensor=SENSOR_DEFAULT):
+    indices = mask_plan(sensor).evaluate(image)
+    return tuple(indices[name] for name in MASK_INDEX_NAMES)
+
+
+class IndexStats:
+    """Accumulates the scene wide percentile, min and max of the mask indices window by window."""
+
+    def __init__(self, thresholds):
+        self.thresholds = thresholds
+        self.sketches = [QuantileSketch() for _ in thresholds]
+        self.mins = [np.inf] * len(thresholds)
+        self.maxs = [-np.inf] * len(thresholds)
+        self.has_nan = [False] * len(thresholds)
+        self.dtype = None
+
+    def update(self, indices):
+        self.dtype = indices[0].dtype
+        for i, index in enumerate(indices):
+            if np.isnan(index).any():
+                self.has_nan[i] = True
+                continue
+            self.sketches[i].update(index)
+            self.mins[i] = min(self.mins[i], index.min())
+            self.maxs[i] = max(self.maxs[i], index.max())
+
+    def result(self):
+        """(percentile value, min, max) of every index."""
+        stats = []
+        for i, threshold in enumerate(self.thresholds):
+            if self.has_nan[i]:
+                # like the whole-array path, a NaN anywhere poisons min and max
+                stats.append((self.dtype.type(np.nan),) * 3)
+                continue
+            threshold_value = self.sketches[i].quantile(threshold)
+            stats.append((self.dtype.type(threshold_value), self.dtype.type(self.mins[i]), self.dtype.type(self.maxs[i])))
+        return stats
+
+# The mask indices of one window (None for the whole raster), sliced from a cached cube or
+# computed from a read of only the bands they use, out_shape (height, width) decimates the read
+def window_indices(src, window=None, cube=None, sensor=SENSOR_DEFAULT, out_shape=None):
+    if cube is not None:
+        with instrument.stage("cache"):
+            return tuple(np.asarray(index[window.toslices()], dtype=np.float32) for index in cube)
+    indexes, plan = mask_reads(sensor)
+    kwargs = dict(out_shape=(len(indexes),) + tuple(out_shape)) if out_shape else {}
+    with instrument.stage("read"):
+        image = read_scaled(src, indexes, window=window, **kwargs)
+    instrument.count("read", bytes_read=image.nbytes)
+    with instrument.stage("indices"):
+        indices = plan.evaluate(image)
+    return tuple(indices[name] for name in MASK_INDEX_NAMES)
+
+# The (ndvi, ndwi, ndbi) cube from an IndexCache, computed window by window into it on a miss
+def cached_indices(src, image_path, cache, windows, sensor=SENSOR_DEFAULT):
+    plan = mask_plan(sensor)
+    cube = cache.load(image_path, plan)
+    if cube is None:
+        with cache.create(image_path, plan, src.height, src.width) as cube:
+            for window in windows:
+                for k, index in enumerate(window_indices(src, window, sensor=sensor)):
+                    cube[k][window.toslices()] = index
+        cube = cache.load(image_path, plan)
+    return cube
+
+# Compute (percentile value, min, max) of every index without holding a full-size array
+def scan_index_stats(src, windows, thresholds, cube=None, sensor=SENSOR_DEFAULT):
+    stats = IndexStats(thresholds)
+    for window in windows:
+        indices = window_indices(src, window, cube, sensor)
+        with instrument.stage("percentile"):
+            stats.update(indices)
+    return stats.result()
+
+# Same as threshold_image followed by percentage_calculate, using precomputed scene stats
+def normalize_with_stats(image, stats):
+    threshold_value, min_value, max_value = stats
+    thresholded_image = np.where(image >= threshold_value, image, min_value)
+    return (thresholded_image - min_value) / (max_value - min_value)
+
+# Classify a window of indices with the scene stats from IndexStats
+def classify_indices(indices, stats, ndvi_t, ndwi_t, ndbi_t, rules=None):
+    ndvi, ndwi, ndbi = (normalize_with_stats(index, s) for index, s in zip(indices, stats))
+    return create_multiclass_mask(ndvi, ndwi, ndbi, ndvi_t, ndwi_t, ndbi_t, rules)
+
+# Extract the base name of the input image and append "_mm"
+def mask_filename(image_path, output_dir, save_format):
     base_name = os.path.splitext(os.path.basename(image_path))[0]
-    output_filename = f"{output_dir}/{base_name}_mm.{save_format}"
+    return f"{output_dir}/{base_name}_mm.{save_format}"
+
+# the streaming processing function, memory is bounded by the window size
+def process_image_streaming(image_path, output_dir, ndvi_t, ndwi_t, ndbi_t, save_format="tif", image_number=1, window_size=None,
+                            blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT, png_level=PNG_LEVEL_DEFAULT, png_strategy=PNG_STRATEGY_DEFAULT,
+                            rules=None, cache=None, sensor=SENSOR_DEFAULT):
+    output_filename = mask_filename(image_path, output_dir, save_format)
+
+    with instrument.scene(image_path), rasterio.open(image_path) as src:
+        windows = list(iter_windows(src, window_size))
+        instrument.count(pixels=src.width * src.height)
+        # with an IndexCache, both passes slice the memory-mapped indices
+        cube = cached_indices(src, image_path, cache, windows, sensor) if cache is not None else None
+
+        # first pass: the scene wide percentile, min and max of each index
+        stats = scan_index_stats(src, windows, (ndvi_t, ndwi_t, ndbi_t), cube, sensor)
+
+        # last pass: classify each window and write it out
+        if save_format != "tif":
+            multiclass_mask = np.zeros((src.height, src.width), dtype=np.uint8)
+            output = nullcontext()
+        else:
+            # staged on disk, the mask is never held in memory as a whole
+            output = open_cog(output_filename, mask_profile(src), blocksize, compress, resampling="mode", in_memory=False)
+
+        with output as dst:
+            for window in windows:
+                indices = window_indices(src, window, cube, sensor)
+                with instrument.stage("mask"):
+                    mask = classify_indices(indices, stats, ndvi_t, ndwi_t, ndbi_t, rules)
+                with instrument.stage("write"):
+                    if save_format != "tif":
+                        multiclass_mask[window.toslices()] = mask
+                    else:
+                        dst.write(mask, 1, window=window)
+            if save_format == "tif":
+                dst.write_colormap(1, CLASS_COLORMAP)
+
+        if save_format == "png":
+            save_image_png(multiclass_mask, output_filename, png_level, png_strategy)
+        elif save_format == "npy":
+            save_image_npy(multiclass_mask, output_filename)
+        else:
+            print(f"✅ Saved as tif: {output_filename}")
 
-    # Save the multiclass mask as a PNG or TIF file
-    if save_format == "png":
-        save_image_png(multiclass_mask, output_filename)
-    else:
-        save_image_tif(multiclass_mask, output_filename, src=src)
+    print(f"✅ Processed image {image_number}.")
+    return output_filename
+
+# the main processing function
+def process_image(image_path, output_dir, ndvi_t, ndwi_t, ndbi_t, save_format="png", image_number=1,
+                  blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT, png_level=PNG_LEVEL_DEFAULT, png_strategy=PNG_STRATEGY_DEFAULT,
+                  rules=None, cache=None, sensor=SENSOR_DEFAULT):
+    with instrument.scene(image_path):
+        with rasterio.open(image_path) as src:
+            if cache is None:
+                # Calculate NDVI, NDWI, and NDBI, only the bands they use are read
+                ndvi, ndwi, ndbi = window_indices(src, sensor=sensor)
+            else:
+                # the indices come memory-mapped from the cache, computed block by block on a miss
+                cube = cached_indices(src, image_path, cache, list(iter_windows(src)), sensor)
+                ndvi, ndwi, ndbi = (np.asarray(index, dtype=np.float32) for index in cube)
+        instrument.count(pixels=src.width * src.height)
+
+        # Threshold the images
+        with instrument.stage("percentile"):
+            ndvi_thresholded = threshold_image(ndvi, ndvi_t)
+            ndwi_thresholded = threshold_image(ndwi, ndwi_t)
+            ndbi_thresholded = threshold_image(ndbi, ndbi_t)
+
+        # convert the images to percentage
+        with instrument.stage("normalize"):
+            ndvi_thresholded = percentage_calculate(ndvi_thresholded)
+            ndwi_thresholded = percentage_calculate(ndwi_thresholded)
+            ndbi_thresholded = percentage_calculate(ndbi_thresholded)
+
+        # create the multiclass mask
+        with instrument.stage("mask"):
+            multiclass_mask = create_multiclass_mask(ndvi_thresholded, ndwi_thresholded, ndbi_thresholded, ndvi_t, ndwi_t, ndbi_t, rules)
+        output_filename = mask_filename(image_path, output_dir, save_format)
+
+        # Save the multiclass mask as a PNG, NPY or TIF file
+        if save_format == "png":
+            save_image_png(multiclass_mask, output_filename, png_level, png_strategy)
+        elif save_format == "npy":
+            save_image_npy(multiclass_mask, output_filename)
+        else:
+            save_image_tif(multiclass_mask, output_filename, src=src, blocksize=blocksize, compress=compress)
 
     print(f"✅ Processed image {image_number}.")
     return multiclass_mask
 
 
+# Label one image inside a worker, errors are returned instead of raised
+def _process_job(job):
+    image_path, output_dir, thresholds, image_number, stream, options = job
+    try:
+        if stream:
+            process_image_streaming(image_path, output_dir, *thresholds, image_number=image_number, **options)
+        else:
+            options = {key: value for key, value in options.items() if key != "window_size"}
+            process_image(image_path, output_dir, *thresholds, image_number=image_number, **options)
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+# Label a list of images, in a process pool when workers > 1
+def process_batch(image_paths, output_dir, ndvi_t, ndwi_t, ndbi_t, workers=1, stream=False, manifest=None, force=False, **options):
+    """Returns one error message (or None) per image, in input order. A failing image does not stop the batch.
+
+    options (save_format, window_size, blocksize, compress, png_level, png_strategy, rules, cache, sensor) go to process_image(_streaming).
+    With a Manifest, images whose mask is current for these parameters are skipped
+    (unless `force`) and every finished image is recorded right away.
+    """
+    jobs = [
+        (image_path, output_dir, (ndvi_t, ndwi_t, ndbi_t), i, stream, options)
+        for i, image_path in enumerate(image_paths, start=1)
+    ]
+    errors = [None] * len(jobs)
+    # the index cache only changes how fast a mask is made, not the mask
+    params = dict(thresholds=[ndvi_t, ndwi_t, ndbi_t], stream=stream, **{key: value for key, value in options.items() if key != "cache"})
+    if manifest is not None and not force:
+        todo = [i for i, image_path in enumerate(image_paths) if not manifest.is_current(image_path, params)]
+        if len(todo) < len(jobs):
+            print(f"⏩ Skipping {len(jobs) - len(todo)} up-to-date images.")
+    else:
+        todo = list(range(len(jobs)))
+
+    def finished(i, error):
+        errors[i] = error
+        if error is None and manifest is not None:
+            manifest.record(image_paths[i], params, [mask_filename(image_paths[i], output_dir, options.get("save_format", "tif" if stream else "png"))])
+        progress_bar.update(1)
+
+    with tqdm(total=len(todo), desc="Labeling images", unit="image") as progress_bar:
+        if workers > 1:
+            # every worker opens its own rasterio handles
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_process_job, jobs[i]): i for i in todo}
+                for future in as_completed(futures):
+                    try:
+                        error = future.result()
+                    except Exception:  # e.g. a worker killed by the OOM killer
+                        error = traceback.format_exc()
+                    finished(futures[future], error)
+        else:
+            for i in todo:
+                finished(i, _process_job(jobs[i]))
+
+    for image_path, error in zip(image_paths, errors):
+        if error is not None:
+            print(f"❌ Failed {image_path}:\n{error}")
+    failed = len(errors) - errors.count(None)
+    print(f"✅ Labeled {len(todo) - failed}/{len(todo)} images.")
+    return errors
+
+
 # args and main function
 if __name__ == "__main__":
     print("✨ Auto Labeling Landsat 8 Images ✨")
     # print with warnining emoji
     print("⚠️ use with radiances images only ⚠️")
     parser = argparse.ArgumentParser(description="Convert Landsat 8 DN values to radiance and save as a multi-band GeoTIFF.")
-    parser.add_argument("-i", type=str, help="Path to the multi-band TIFF image or directory containing images.")
+    parser.add_argument("-i", type=str, nargs="+", help="Path to the multi-band TIFF image or directory containing images; several images or a glob are labeled as one virtual mosaic.")
     parser.add_argument("-o", type=str, help="Path to save the output radiance GeoTIFF.")
     parser.add_argument("-show", action="store_true", help="Visualize the multiclass mask.")
     # Add an argument for thresholds (ndvi, ndwi, ndbi)
     parser.add_argument("--ndvi", type=float, default=NDVI_THRESHOLD , help="NDVI threshold.")
     parser.add_argument("--ndwi", type=float, default=NDWI_THRESHOLD, help="NDWI threshold.")
     parser.add_argument("--ndbi", type=float, default=NDBI_THRESHOLD, help="NDBI threshold.")
-    parser.add_argument("--format", type=str, choices=["tif", "png"], default="tif", help="Output format: 'tif' or 'png'.")
+    parser.add_argument("--sensor", choices=list(SENSOR_BANDS), default=SENSOR_DEFAULT, help=f"Band layout of the input images (default: {SENSOR_DEFAULT}).")
+    parser.add_argument("--format", type=str, choices=MASK_FORMATS, default="tif", help="Output format: 'tif' (COG), 'png' (palette) or 'npy' (bit-packed), see mask_io.py.")
+    parser.add_argument("--vector", choices=["geojson", "gpkg"], default=None, help="Also polygonize the mask of a single image or mosaic into per class polygons, see vectorize.py.")
+    parser.add_argument("--simplify", type=float, default=0.0, help="Simplification tolerance of the --vector polygons in map units, 0 keeps the pixel edges (default: 0).")
+    parser.add_argument("--stream", action="store_true", help="Process window by window to bound memory use.")
+    parser.add_argument("--window", type=int, default=0, help="Window size in pixels for --stream (default: the raster's internal blocks).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes when -i is a directory.")
+    parser.add_argument("--blocksize", type=int, default=BLOCKSIZE_DEFAULT, help=f"Internal tile size of the output COG (default: {BLOCKSIZE_DEFAULT}).")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=COMPRESS_DEFAULT, help=f"Output COG compression (default: {COMPRESS_DEFAULT}).")
+    parser.add_argument("--png-level", type=int, default=PNG_LEVEL_DEFAULT, help=f"PNG zlib compression level 0-9 (default: {PNG_LEVEL_DEFAULT}).")
+    parser.add_argument("--png-strategy", choices=list(PNG_STRATEGIES), default=PNG_STRATEGY_DEFAULT, help=f"PNG zlib strategy (default: {PNG_STRATEGY_DEFAULT}).")
+    parser.add_argument("--rules", type=str, default=None, help="JSON rule table of [class, index, comparator, threshold] entries on the normalized ndvi/ndwi/ndbi, highest priority first (default: water > urban > vegetation at the thresholds above).")
+    parser.add_argument("--cache", type=str, default=None, help="Directory caching the computed indices of every image, reruns with other thresholds skip reading and computing them.")
+    parser.add_argument("--cache-size", type=float, default=CACHE_SIZE_DEFAULT / 2**30, help=f"Size cap of the --cache in GiB, least recently used scenes are evicted (default: {CACHE_SIZE_DEFAULT / 2**30:g}).")
+    parser.add_argument("--cache-dtype", choices=CACHE_DTYPES, default=CACHE_DTYPES[0], help="Storage type of the cached indices, float16 halves the size at reduced precision (default: float32).")
+    parser.add_argument("--report", type=str, default=None, help="Append per stage timings of every image to this JSON lines file.")
+    parser.add_argument("--trace-memory", action="store_true", help="Also record the peak traced (numpy) memory in the --report.")
+    parser.add_argument("--force", action="store_true", help=f"Relabel all images of a directory, even those {MANIFEST_NAME} lists as up to date.")
     args = parser.parse_args()
+    if args.report:
+        instrument.enable(args.report, args.trace_memory)
+    rules = load_rules(args.rules) if args.rules else None
+    cache = IndexCache(args.cache, int(args.cache_size * 2**30), args.cache_dtype) if args.cache else None
 
-    input_path = args.i
+    input_paths = expand_inputs(args.i)
 
     # Check if the input path is valid
-    if not os.path.exists(input_path):
-        print("Invalid input path:", input_path)
-        exit()
+    for input_path in input_paths:
+        if not os.path.exists(input_path):
+            print("Invalid input path:", input_path)
+            exit()
     
     os.makedirs(args.o, exist_ok=True)
 
-    # Process a single image or a directory of images
-    if os.path.isfile(input_path):
-        mm = process_image(input_path, args.o, args.ndvi, args.ndwi, args.ndbi, save_format=args.format)
-
-        if args.show:
-            visualize_multiclass_mask(mm)
+    # Process a single image (several are read as one mosaic, without merging them) or a directory of images
+    with open_mosaic(input_paths) as input_path:
+        if len(input_paths) > 1 or os.path.isfile(input_path):
+            if args.stream:
+                output_filename = process_image_streaming(input_path, args.o, args.ndvi, args.ndwi, args.ndbi, save_format=args.format, window_size=args.window,
+                                                          blocksize=args.blocksize, compress=args.compress, png_level=args.png_level, png_strategy=args.png_strategy, rules=rules, cache=cache, sensor=args.sensor)
+                if args.show:
+                    from show_label import load_mask
+                    visualize_multiclass_mask(load_mask(output_filename))
+            else:
+                mm = process_image(input_path, args.o, args.ndvi, args.ndwi, args.ndbi, save_format=args.format,
+                                   blocksize=args.blocksize, compress=args.compress, png_level=args.png_level, png_strategy=args.png_strategy, rules=rules, cache=cache, sensor=args.sensor)
+
+                if args.show:
+                    visualize_multiclass_mask(mm)
+
+            if args.vector:
+                from vectorize import vectorize
+                mask_path = mask_filename(input_path, args.o, args.format)
+                vectorize(mask_path, f"{os.path.splitext(mask_path)[0]}.{args.vector}", like=input_path, simplify=args.simplify)
             
-    elif os.path.isdir(input_path):
-        image_files = [f for f in os.listdir(input_path) if f.endswith('.tif')]
-        for i, image_file in enumerate(image_files, start=1):
-            image_path = os.path.join(input_path, image_file)
-            process_image(image_path, args.o, args.ndvi, args.ndwi, args.ndbi, save_format=args.format, image_number=i)
-    else:
-        print("Invalid input path:", input_path)
-        exit()
+        elif os.path.isdir(input_path):
+            image_files = sorted(f for f in os.listdir(input_path) if f.endswith('.tif'))
+            image_paths = [os.path.join(input_path, image_file) for image_file in image_files]
+            # finished images are recorded in the output directory, reruns only redo what changed
+            manifest = Manifest(os.path.join(args.o, MANIFEST_NAME))
+            errors = process_batch(image_paths, args.o, args.ndvi, args.ndwi, args.ndbi, workers=args.workers, stream=args.stream,
+                                   manifest=manifest, force=args.force, save_format=args.format, window_size=args.window, blocksize=args.blocksize, compress=args.compress,
+                                   png_level=args.png_level, png_strategy=args.png_strategy, rules=rules, cache=cache, sensor=args.sensor)
+        else:
+            print("Invalid input path:", input_path)
+            exit()
 
     # generate a csv file with the calsses constants
     with open('classes.csv', mode='w') as file:
@@ -251,4 +495,7 @@ if __name__ == "__main__":
         writer.writerow(["Water", WATER])
         writer.writerow(["Urban", URBAN])
 
-    print("✅ Saved classes to classes.csv")
\ No newline at end of file
+    print("✅ Saved classes to classes.csv")
+
+    if os.path.isdir(input_path) and any(errors):
+        exit(1)
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""Threaded PNG/WebP/JPEG encoding stage shared by the image exporters.
+
+Producers hand uint8 arrays to an Encoder, which compresses and writes them on
+a small thread pool (OpenCV releases the GIL while encoding) while the producer
+moves on to the next image. At most `max_pending` images wait in the queue, so
+a fast producer blocks instead of filling memory. Arrays are not copied: do not
+modify an array after submitting it.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+import instrument
+from manifest import atomic_path
+
+IMAGE_FORMATS = ["png", "webp", "jpg"]
+# zlib level, 0 (store) to 9 (smallest), 6 is what PIL wrote before
+PNG_LEVEL_DEFAULT = 6
+PNG_STRATEGIES = {
+    "default": cv2.IMWRITE_PNG_STRATEGY_DEFAULT,
+    "filtered": cv2.IMWRITE_PNG_STRATEGY_FILTERED,
+    "huffman": cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY,
+    "rle": cv2.IMWRITE_PNG_STRATEGY_RLE,
+    "fixed": cv2.IMWRITE_PNG_STRATEGY_FIXED,
+}
+PNG_STRATEGY_DEFAULT = "default"
+# JPEG quality; WebP is always written lossless
+QUALITY_DEFAULT = 95
+ENCODE_WORKERS_DEFAULT = min(4, os.cpu_count() or 1)
+
+
+def encode_params(image_format, level=PNG_LEVEL_DEFAULT, strategy=PNG_STRATEGY_DEFAULT, quality=QUALITY_DEFAULT):
+    """OpenCV imencode parameters for one of IMAGE_FORMATS."""
+    if image_format == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, level, cv2.IMWRITE_PNG_STRATEGY, PNG_STRATEGIES[strategy]]
+    if image_format == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, 101]  # above 100 is lossless
+    if image_format == "jpg":
+        return [cv2.IMWRITE_JPEG_QUALITY, quality]
+    raise ValueError(f"Unknown image format: {image_format}")
+
+
+def encode_image(image, path, params):
+    """Encodes a (height, width) or (height, width, 3/4) RGB(A) uint8 array and writes it, returns the encoded size."""
+    with instrument.stage("encode"):
+        if image.ndim == 3:
+            image = image[..., [2, 1, 0, 3][:image.shape[2]]] if image.shape[2] == 4 else image[..., ::-1]  # OpenCV wants BGR
+        ok, data = cv2.imencode(os.path.splitext(path)[1], image, params)
+    if not ok:
+        raise IOError(f"Could not encode {path}")
+    with instrument.stage("write"), atomic_path(path) as tmp, open(tmp, "wb") as f:
+        f.write(data)
+    instrument.count("write", bytes_written=data.size)
+    return data.size
+
+
+def write_image(image, path, level=PNG_LEVEL_DEFAULT, strategy=PNG_STRATEGY_DEFAULT, quality=QUALITY_DEFAULT):
+    """Encodes and writes one image right away, the format comes from the file extension."""
+    image_format = os.path.splitext(path)[1][1:].lower().replace("jpeg", "jpg")
+    return encode_image(image, path, encode_params(image_format, level, strategy, quality))
+
+
+class Encoder:
+    """Bounded queue of images encoded and written on a thread pool. Use as a context manager."""
+
+    def __init__(self, image_format="png", workers=ENCODE_WORKERS_DEFAULT, level=PNG_LEVEL_DEFAULT,
+                 strategy=PNG_STRATEGY_DEFAULT, quality=QUALITY_DEFAULT, max_pending=None):
+        self.image_format = image_format
+        self.params = encode_params(image_format, level, strategy, quality)
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_seconds = 0.0
+        self._started = self._finished = None
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * workers)
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def submit(self, image, path):
+        """Queues an image, blocking while the queue is full. The extension of path is replaced by the format's."""
+        path = f"{os.path.splitext(path)[0]}.{self.image_format}"
+        self._slots.acquire()
+        if self._started is None:
+            self._started = time.perf_counter()
+        future = self._executor.submit(self._encode, image, path)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+        return path
+
+    def _encode(self, image, path):
+        start = time.perf_counter()
+        size = encode_image(image, path, self.params)
+        with self._lock:
+            self.images += 1
+            self.bytes_in += image.nbytes
+            self.bytes_out += size
+            self.encode_seconds += time.perf_counter() - start
+        return path
+
+    def close(self):
+        """Waits for the queue to drain and returns the throughput stats, raises the first encoding error."""
+        self._executor.shutdown(wait=True)
+        if self._started is not None:
+            self._finished = time.perf_counter()
+        for future in self._futures:
+            future.result()
+        return self.stats()
+
+    def stats(self):
+        wall = (self._finished or time.perf_counter()) - self._started if self._started is not None else 0.0
+        return {
+            "format": self.image_format,
+            "images": self.images,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "encode_seconds": self.encode_seconds,
+            "wall_seconds": wall,
+            "images_per_second": self.images / wall if wall else 0.0,
+            "mb_per_second": self.bytes_in / wall / 1e6 if wall else 0.0,
+        }
+
+    def report(self):
+        stats = self.stats()
+        ratio = stats["bytes_in"] / stats["bytes_out"] if stats["bytes_out"] else 0.0
+        print(f"Encoded {stats['images']} {self.image_format} images in {stats['wall_seconds']:.1f}s: "
+              f"{stats['images_per_second']:.1f} images/s, {stats['mb_per_second']:.1f} MB/s raw, {ratio:.1f}x smaller")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            return
+        self.close()
+        self.report()
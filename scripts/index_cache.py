@@ -0,0 +1,104 @@
+"""On-disk cache of computed index rasters.
+
+Index cubes (one (indices, height, width) .npy per scene and IndexPlan) are
+keyed by the input file's absolute path, size and modification time and by the
+plan's expressions and band mapping, so a changed scene or band mapping never
+hits a stale entry. Entries are memory-mapped read-only on reuse, nothing is
+copied until a window is touched. The total size is capped, the least recently
+used entries (by file modification time, refreshed on every hit) go first.
+"""
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+import numpy as np
+import rasterio
+
+from manifest import atomic_path
+
+CACHE_SIZE_DEFAULT = 10 << 30  # bytes
+CACHE_DTYPES = ["float32", "float16"]
+
+
+def file_identity(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def plan_key(image_path, plan, dtype):
+    """Cache key of the indices of plan over image_path, stored as dtype."""
+    if os.path.exists(image_path):
+        identity = file_identity(image_path)
+    else:
+        # a GDAL virtual dataset (e.g. an in-memory mosaic), keyed by the files it reads
+        with rasterio.open(image_path) as src:
+            identity = {"sources": [file_identity(path) for path in src.files if os.path.exists(path)]}
+    identity.update({
+        "indices": {name: repr(tree) for name, tree in plan.outputs.items()},
+        "bands": plan.bands,
+        "dtype": np.dtype(dtype).name,
+    })
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()[:32]
+
+
+class IndexCache:
+    """Index cubes of scenes in a directory, capped at max_bytes with LRU eviction."""
+
+    def __init__(self, directory, max_bytes=CACHE_SIZE_DEFAULT, dtype="float32"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, image_path, plan):
+        return os.path.join(self.directory, plan_key(image_path, plan, self.dtype) + ".npy")
+
+    def load(self, image_path, plan):
+        """Read-only memmap of the cached (indices, height, width) cube, or None on a miss."""
+        path = self.path(image_path, plan)
+        try:
+            cube = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # most recently used
+        return cube
+
+    @contextmanager
+    def create(self, image_path, plan, height, width):
+        """Yields a writable memmap for the cube, stored (and old entries evicted) when the block succeeds."""
+        path = self.path(image_path, plan)
+        with atomic_path(path) as tmp:
+            cube = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype, shape=(len(plan.names), height, width))
+            yield cube
+            cube.flush()
+            del cube
+        self.evict(keep=path)
+
+    def entries(self):
+        """(path, size, mtime) of the cached cubes, least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy") or ".partial-" in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+        """Removes the least recently used cubes until the cache fits max_bytes, keep is never removed."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)  # open memmaps stay valid
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,140 @@
+"""Opt-in per stage timing and memory instrumentation.
+
+Disabled by default, stages then cost a no-op context manager. Once enabled
+(enable(), the --report options of the scripts or the INSTRUMENT_REPORT
+environment variable), every scene adds one JSON line to the report file:
+
+    {"scene": ..., "script": ..., "wall_seconds": ..., "cpu_seconds": ...,
+     "pixels": ..., "bytes_read": ..., "bytes_written": ..., "process_peak_rss_mb": ...,
+     "peak_traced_mb": ..., "stages": {"read": {"calls", "wall_seconds",
+     "cpu_seconds", "pixels", "bytes_read", "bytes_written"}, ...}}
+
+Stages may run on several threads at once (the tilers), their times then add
+up to more than the scene's wall time. CPU time is the whole process's.
+process_peak_rss_mb is the resident memory peak of the process so far, in a
+batch it includes the scenes before; peak_traced_mb (--trace-memory) is the
+scene's own peak. Worker processes inherit the setting through the environment
+and append their own lines; each line is written with a single append.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_ENV = "INSTRUMENT_REPORT"
+TRACE_ENV = "INSTRUMENT_TRACE_MEMORY"
+COUNTERS = ("pixels", "bytes_read", "bytes_written")
+
+_lock = threading.Lock()
+_report_path = None
+_trace_memory = False
+_scene = None
+
+
+def enable(report_path, trace_memory=False):
+    """Starts recording, scenes are appended to report_path as JSON lines.
+
+    trace_memory also records the tracemalloc peak per scene, which slows numpy
+    allocations down a little.
+    """
+    global _report_path, _trace_memory
+    _report_path, _trace_memory = report_path, trace_memory
+    # worker processes pick the setting up when they import this module
+    os.environ[REPORT_ENV] = report_path
+    os.environ[TRACE_ENV] = "1" if trace_memory else ""
+
+
+def enabled():
+    return _report_path is not None
+
+
+def _new_stage():
+    return dict(calls=0, wall_seconds=0.0, cpu_seconds=0.0, **{counter: 0 for counter in COUNTERS})
+
+
+@contextmanager
+def _scene_record(name, script):
+    global _scene
+    if _trace_memory:
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+    record = dict(scene=name, script=script, host=socket.gethostname(), pid=os.getpid(), started=time.time(),
+                  stages={}, **{counter: 0 for counter in COUNTERS})
+    wall, cpu = time.perf_counter(), time.process_time()
+    _scene = record
+    try:
+        yield record
+    finally:
+        _scene = None
+        record["wall_seconds"] = time.perf_counter() - wall
+        record["cpu_seconds"] = time.process_time() - cpu
+        # the peak since the process started, not since the scene did
+        record["process_peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None  # KB on Linux
+        record["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 1e6 if _trace_memory else None
+        line = json.dumps(record) + "\n"
+        with open(_report_path, "a") as f:
+            f.write(line)
+
+
+def scene(name, script=None):
+    """Context manager grouping the stages of one input scene into a report line."""
+    if _report_path is None or _scene is not None:  # nested scenes belong to the outer one
+        return nullcontext()
+    return _scene_record(name, script or os.path.basename(sys.argv[0]))
+
+
+@contextmanager
+def _stage_record(name, counters):
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        scene_record = _scene
+        if scene_record is not None:
+            with _lock:
+                stage_record = scene_record["stages"].setdefault(name, _new_stage())
+                stage_record["calls"] += 1
+                stage_record["wall_seconds"] += wall
+                stage_record["cpu_seconds"] += cpu
+                for counter, value in counters.items():
+                    stage_record[counter] += value
+                    scene_record[counter] += value
+
+
+def stage(name, **counters):
+    """Context manager timing one step of the current scene, counters are pixels, bytes_read and bytes_written."""
+    if _scene is None:
+        return nullcontext()
+    return _stage_record(name, counters)
+
+
+def count(name=None, **counters):
+    """Adds counters to a stage of the current scene without timing anything, or to the scene only without a name."""
+    scene_record = _scene
+    if scene_record is None:
+        return
+    with _lock:
+        for counter, value in counters.items():
+            if name is not None:
+                scene_record["stages"].setdefault(name, _new_stage())[counter] += value
+            scene_record[counter] += value
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+if os.environ.get(REPORT_ENV):
+    enable(os.environ[REPORT_ENV], bool(os.environ.get(TRACE_ENV)))
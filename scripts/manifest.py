@@ -0,0 +1,101 @@
+"""Records of finished batch work, so reruns only redo what changed.
+
+A Manifest maps every input file to the hash of its content, the parameters it
+was processed with and the outputs that were written. An entry is current while
+the input hash and parameters match and every output still exists with its
+recorded size. Input hashes are cached by file size and modification time, so
+unchanged scenes are not read again. The manifest itself and the outputs of the
+writers in this package are written through temp files and renames, so an
+interrupted run never leaves a truncated file under its final name.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+MANIFEST_NAME = "manifest.json"
+# bytes read per hash update
+HASH_CHUNK = 1 << 20
+
+
+@contextmanager
+def atomic_path(path):
+    """Yields a temp path next to `path` that is renamed to `path` when the block succeeds.
+
+    The temp path keeps the extension, for writers that pick the format from it.
+    """
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.partial-{os.getpid()}-{threading.get_ident()}{ext}"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def file_hash(path):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_key(params):
+    """Canonical string of a JSON-serializable parameter dict."""
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class Manifest:
+    """Input file -> (content hash, parameters, outputs) records, saved as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._hashes = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)["entries"]
+
+    def input_hash(self, input_path):
+        """Content hash of input_path, reused from the manifest while size and mtime are unchanged."""
+        stat = os.stat(input_path)
+        entry = self.entries.get(os.path.abspath(input_path))
+        if entry is not None and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return entry["hash"]
+        key = (os.path.abspath(input_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(input_path)
+        return self._hashes[key]
+
+    def is_current(self, input_path, params):
+        """True if input_path was processed with params and all its outputs are still there."""
+        entry = self.entries.get(os.path.abspath(input_path))
+        if entry is None or entry["params"] != params_key(params):
+            return False
+        if entry["hash"] != self.input_hash(input_path):
+            return False
+        return all(os.path.exists(output) and os.path.getsize(output) == size for output, size in entry["outputs"].items())
+
+    def outputs(self, input_path):
+        return list(self.entries[os.path.abspath(input_path)]["outputs"])
+
+    def record(self, input_path, params, outputs):
+        """Marks input_path as done with params, writing outputs (a list of file paths), and saves the manifest."""
+        stat = os.stat(input_path)
+        self.entries[os.path.abspath(input_path)] = {
+            "hash": self.input_hash(input_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "params": params_key(params),
+            "outputs": {os.path.abspath(output): os.path.getsize(output) for output in outputs},
+        }
+        self.save()
+
+    def save(self):
+        with atomic_path(self.path) as tmp:
+            with open(tmp, "w") as f:
+                json.dump({"entries": self.entries}, f, indent=1)
@@ -0,0 +1,131 @@
+"""Compact storage of class masks.
+
+Masks hold a handful of small class values, each format stores them as such:
+
+- tif: Cloud Optimized GeoTIFF, DEFLATE/ZSTD/LZW with the horizontal
+  predictor (see raster_io.open_cog), mode overviews and the class colors as
+  its color table.
+- png: palette PNG with the class colors embedded, at the smallest bit depth
+  that holds the classes (2 bits per pixel for 4 classes).
+- npy: bit-packed rows (2 bits per pixel for 4 classes) in a plain .npy that
+  can be memory-mapped. The single field of its structured dtype records the
+  bits per pixel and the width, e.g. "b2w900".
+
+read_mask reads all of them (and plain grayscale PNG masks) back to a uint8
+class array.
+"""
+import os
+import re
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from PIL import Image
+
+import instrument
+from manifest import atomic_path
+from encoder import PNG_LEVEL_DEFAULT, PNG_STRATEGIES, PNG_STRATEGY_DEFAULT
+from raster_io import BLOCKSIZE_DEFAULT, COMPRESS_DEFAULT, open_cog, preview_shape
+
+MASK_FORMATS = ["tif", "png", "npy"]
+# RGB of background, vegetation, water and urban, as in show_label's color map
+CLASS_COLORS = [(0, 0, 0), (0, 128, 0), (0, 0, 255), (255, 0, 0)]
+# GeoTIFF color table
+CLASS_COLORMAP = {c: color + (255,) for c, color in enumerate(CLASS_COLORS)}
+_PACKED_FIELD = re.compile(r"b(\d)w(\d+)$")
+
+
+def mask_bits(mask):
+    """Smallest of 1, 2, 4 or 8 bits per pixel that holds the largest class value."""
+    top = int(mask.max()) if mask.size else 0
+    return next(bits for bits in (1, 2, 4, 8) if top < 1 << bits)
+
+
+def palette(classes=len(CLASS_COLORS)):
+    """Flat RGB palette of `classes` entries, classes beyond CLASS_COLORS are gray levels."""
+    colors = CLASS_COLORS[:classes] + [(c, c, c) for c in range(len(CLASS_COLORS), classes)]
+    return [value for color in colors for value in color]
+
+
+def pack_mask(mask, bits=None):
+    """(height, width) uint8 classes -> (height, packed width) bytes, the leftmost pixel in the high bits."""
+    bits = bits or mask_bits(mask)
+    per_byte = 8 // bits
+    height, width = mask.shape
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = mask
+    shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+    return np.bitwise_or.reduce(padded.reshape(height, -1, per_byte) << shifts, axis=-1).astype(np.uint8)
+
+
+def unpack_mask(packed, bits, width):
+    """Inverse of pack_mask."""
+    shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+    values = (np.asarray(packed)[..., None] >> shifts) & ((1 << bits) - 1)
+    return values.reshape(packed.shape[0], -1)[:, :width]
+
+
+def write_mask(mask, path, src=None, blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT,
+               level=PNG_LEVEL_DEFAULT, strategy=PNG_STRATEGY_DEFAULT):
+    """Writes a (height, width) uint8 class mask, the format follows the extension of path.
+
+    GeoTIFFs are placed on the grid of `src` (blocksize, compress), the other
+    formats carry no georeferencing; level and strategy tune the PNG zlib stream.
+    """
+    mask = np.asarray(mask, dtype=np.uint8)
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext == "tif":
+        profile = dict(height=mask.shape[0], width=mask.shape[1], count=1, dtype=np.uint8, crs=src.crs, transform=src.transform)
+        # Cloud Optimized GeoTIFF, class masks get mode overviews
+        with open_cog(path, profile, blocksize, compress, resampling="mode") as dst:
+            dst.write(mask, 1)
+            dst.write_colormap(1, CLASS_COLORMAP)
+        return path
+
+    with instrument.stage("write"):
+        if ext == "png":
+            image = Image.fromarray(mask, "P")
+            # PIL picks the bit depth from the palette size
+            image.putpalette(palette(1 << mask_bits(mask)))
+            with atomic_path(path) as tmp:
+                image.save(tmp, "PNG", compress_level=level, compress_type=PNG_STRATEGIES[strategy])
+        elif ext == "npy":
+            bits = mask_bits(mask)
+            packed = pack_mask(mask, bits)
+            with atomic_path(path) as tmp:
+                np.save(tmp, packed.view(np.dtype([(f"b{bits}w{mask.shape[1]}", np.uint8)])))
+        else:
+            raise ValueError(f"Unsupported mask format: {path}, use one of {MASK_FORMATS}.")
+    instrument.count("write", bytes_written=instrument.file_size(path))
+    return path
+
+
+def read_mask(path, max_size=None):
+    """uint8 class mask from any of MASK_FORMATS, max_size limits the longest side for previews (None for full resolution)."""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("tif", "tiff"):
+        with rasterio.open(path) as src:
+            # decimated reads come from the (mode) overviews when there are any,
+            # nearest keeps class values intact otherwise
+            height, width = preview_shape(src, max_size)
+            return src.read(1, out_shape=(height, width), resampling=Resampling.nearest)  # First band
+    if ext == "png":
+        # palette PNGs decode to their indices, grayscale ones to their values
+        with Image.open(path) as image:
+            mask = np.asarray(image)
+        if mask.ndim != 2:
+            raise ValueError(f"{path} is not a single channel or palette mask.")
+        # PIL has no reduced PNG reads, and averaging would mix class values
+        step = int(np.ceil(max(mask.shape) / max_size)) if max_size else 1
+        return mask[::step, ::step] if step > 1 else mask
+    if ext == "npy":
+        packed = np.load(path, mmap_mode="r")
+        match = _PACKED_FIELD.match(packed.dtype.names[0]) if packed.dtype.names else None
+        if match is None:
+            raise ValueError(f"{path} is not a packed mask written by write_mask.")
+        bits, width = int(match[1]), int(match[2])
+        packed = packed[packed.dtype.names[0]]
+        step = int(np.ceil(max(packed.shape[0], width) / max_size)) if max_size else 1
+        # only the rows that are kept are unpacked
+        mask = unpack_mask(packed[::step], bits, width)
+        return np.ascontiguousarray(mask[:, ::step]).astype(np.uint8, copy=False)
+    raise ValueError("Unsupported file format. Use .tif, .png or .npy.")
@@ -0,0 +1,172 @@
+"""Class balance and label agreement statistics over many mask files.
+
+Every mask (GeoTIFF, PNG or packed .npy, see mask_io.read_mask) is read once, in a
+process pool. Class histograms come from np.bincount; with --reference, each
+auto label is paired with the hand-corrected mask of the same name and the
+confusion matrix is the bincount of the combined codes reference * k + label.
+Writes <output>_files.csv (one row per mask), <output>_confusion.csv and
+<output>_summary.json (aggregate counts, class fractions and, for pairs,
+accuracy and per class precision, recall and IoU).
+"""
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tqdm import tqdm
+
+from manifest import atomic_path
+from show_label import class_labels, load_mask
+
+MASK_EXTENSIONS = (".png", ".tif", ".tiff", ".npy")
+WORKERS_DEFAULT = min(8, os.cpu_count() or 1)
+
+
+def find_masks(paths):
+    """Mask files in the given files and directories (searched recursively), sorted."""
+    masks = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                masks.extend(os.path.join(root, f) for f in files if f.lower().endswith(MASK_EXTENSIONS))
+        else:
+            masks.append(path)
+    return sorted(masks)
+
+
+def find_reference(mask_path, reference_dir):
+    """The reference mask with the same base name as mask_path (any mask extension), or None."""
+    base = os.path.splitext(os.path.basename(mask_path))[0]
+    for ext in MASK_EXTENSIONS:
+        candidate = os.path.join(reference_dir, base + ext)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _pad(counts, size):
+    return np.pad(counts, (0, size - counts.size)) if counts.size < size else counts
+
+
+def mask_stats(mask_path, reference_path=None, num_classes=len(class_labels)):
+    """(histogram, confusion or None) of one mask, each file is read once."""
+    mask = load_mask(mask_path)
+    histogram = _pad(np.bincount(mask.ravel()), num_classes)
+    if reference_path is None:
+        return histogram, None
+
+    reference = load_mask(reference_path)
+    if reference.shape != mask.shape:
+        raise ValueError(f"{mask_path} is {mask.shape}, its reference {reference_path} is {reference.shape}.")
+    k = max(num_classes, int(mask.max()) + 1, int(reference.max()) + 1)
+    codes = reference.astype(np.int64).ravel() * k + mask.ravel()
+    confusion = np.bincount(codes, minlength=k * k).reshape(k, k)
+    return histogram, confusion
+
+
+def _job(job):
+    mask_path, reference_path, num_classes = job
+    return mask_stats(mask_path, reference_path, num_classes)
+
+
+def _grow(matrix, size):
+    grown = np.zeros((size, size), dtype=np.int64)
+    grown[:matrix.shape[0], :matrix.shape[1]] = matrix
+    return grown
+
+
+def agreement(confusion):
+    """Overall accuracy and per class precision, recall and IoU of a (reference x label) confusion matrix."""
+    true_positive = np.diag(confusion).astype(np.float64)
+    labeled, referenced = confusion.sum(axis=0), confusion.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = true_positive / labeled
+        recall = true_positive / referenced
+        iou = true_positive / (labeled + referenced - true_positive)
+    nan_to_none = lambda values: [None if np.isnan(v) else float(v) for v in values]
+    return {
+        "accuracy": float(true_positive.sum() / confusion.sum()) if confusion.sum() else None,
+        "precision": nan_to_none(precision),
+        "recall": nan_to_none(recall),
+        "iou": nan_to_none(iou),
+    }
+
+
+def class_names(k):
+    return [class_labels[c] if c < len(class_labels) else f"Class {c}" for c in range(k)]
+
+
+def collect(mask_paths, output, reference_dir=None, workers=WORKERS_DEFAULT, num_classes=len(class_labels)):
+    """Computes and writes the statistics, returns the summary dict."""
+    pairs = [(path, find_reference(path, reference_dir) if reference_dir else None) for path in mask_paths]
+    if reference_dir:
+        missing = [path for path, reference in pairs if reference is None]
+        if missing:
+            print(f"⚠️ No reference for {len(missing)} masks, they only count towards the histograms.")
+
+    total = np.zeros(num_classes, dtype=np.int64)
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    files_csv = f"{output}_files.csv"
+    with atomic_path(files_csv) as tmp, open(tmp, "w", newline="") as f, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        writer = csv.writer(f)
+        writer.writerow(["file", "pixels"] + [f"class_{c}" for c in range(num_classes)] + ["reference", "accuracy"])
+        jobs = ((path, reference, num_classes) for path, reference in pairs)
+        results = executor.map(_job, jobs, chunksize=64)
+        for (path, reference), (histogram, file_confusion) in tqdm(zip(pairs, results), total=len(pairs), desc="Reading masks", unit="mask"):
+            if histogram.size > total.size:  # the per file rows keep the header's classes, the summary gets all
+                total = _pad(total, histogram.size)
+            total[:histogram.size] += histogram
+            accuracy = None
+            if file_confusion is not None:
+                if file_confusion.shape[0] > confusion.shape[0]:
+                    confusion = _grow(confusion, file_confusion.shape[0])
+                confusion[:file_confusion.shape[0], :file_confusion.shape[1]] += file_confusion
+                accuracy = np.trace(file_confusion) / file_confusion.sum() if file_confusion.sum() else None
+            writer.writerow([path, int(histogram.sum())] + [int(n) for n in histogram[:num_classes]] +
+                            [reference or "", "" if accuracy is None else round(float(accuracy), 6)])
+
+    # classes beyond num_classes only show up if some mask has them
+    size = max(total.size, confusion.shape[0])
+    present = np.flatnonzero(_pad(total, size) + _pad(confusion.sum(axis=1), size))
+    k = max(num_classes, int(present[-1]) + 1 if present.size else 0)
+    total = _pad(total, k)[:k]
+    summary = {
+        "files": len(pairs),
+        "pixels": int(total.sum()),
+        "classes": class_names(k),
+        "counts": [int(n) for n in total],
+        "fractions": [float(n / total.sum()) if total.sum() else 0.0 for n in total],
+    }
+    if reference_dir:
+        confusion = _grow(confusion, k) if confusion.shape[0] < k else confusion[:k, :k]
+        summary["pairs"] = sum(reference is not None for _, reference in pairs)
+        summary["confusion"] = confusion.tolist()  # rows: reference class, columns: auto label class
+        summary.update(agreement(confusion))
+        with atomic_path(f"{output}_confusion.csv") as tmp, open(tmp, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["reference \\ label"] + summary["classes"])
+            for name, row in zip(summary["classes"], confusion):
+                writer.writerow([name] + [int(n) for n in row])
+
+    with atomic_path(f"{output}_summary.json") as tmp, open(tmp, "w") as f:
+        json.dump(summary, f, indent=1)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Class histograms and auto label vs reference confusion matrices over many masks.")
+    parser.add_argument("masks", nargs="+", help="Mask files or directories of masks (.png/.tif).")
+    parser.add_argument("-o", "--output", default="mask_stats", help="Output path prefix (default: mask_stats).")
+    parser.add_argument("--reference", default=None, help="Directory of hand-corrected masks, matched by file name.")
+    parser.add_argument("--classes", type=int, default=len(class_labels), help=f"Number of classes (default: {len(class_labels)}).")
+    parser.add_argument("--workers", type=int, default=WORKERS_DEFAULT, help=f"Worker processes (default: {WORKERS_DEFAULT}).")
+    args = parser.parse_args()
+
+    summary = collect(find_masks(args.masks), args.output, args.reference, args.workers, args.classes)
+    for name, count, fraction in zip(summary["classes"], summary["counts"], summary["fractions"]):
+        print(f"{name}: {count} pixels ({fraction:.2%})")
+    if "accuracy" in summary:
+        print(f"Agreement with the reference over {summary['pairs']} masks: {summary['accuracy']:.2%}")
+    print(f"✅ Saved {args.output}_summary.json")
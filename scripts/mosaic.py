@@ -0,0 +1,111 @@
+"""Virtual mosaics of adjacent scenes.
+
+A list of scenes on the same CRS and pixel grid is described by a GDAL VRT
+held in memory: nothing is merged or written, every read of the mosaic is
+served window by window from the scenes it touches. Where scenes overlap the
+later one wins, their nodata pixels (each scene's own nodata value) let the
+earlier ones show through, the mosaic's nodata is that of the first. The
+mosaic path works with rasterio.open (in this process, while the mosaic is
+open), so the labeling and tiling entry points take it like a file. Outputs
+are named after the first and last scene, see mosaic_name.
+"""
+import glob
+import os
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+import rasterio
+from rasterio.dtypes import dtype_rev, typename_fwd
+from rasterio.io import MemoryFile
+
+# fraction of a pixel two scene grids may be off by
+GRID_TOLERANCE = 0.01
+
+
+def expand_inputs(patterns):
+    """Sorted scene paths from a list of file paths and glob patterns."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No files match {pattern}")
+        paths.extend(matches)
+    return paths
+
+
+def mosaic_name(paths):
+    """Name of the mosaic of the scenes: the names of its first and last scene, joined by an underscore."""
+    return "_".join(os.path.splitext(os.path.basename(path))[0] for path in (paths[0], paths[-1]))
+
+
+def _profile(src):
+    return src.crs, src.res, src.count, src.dtypes[0]
+
+
+def _scaling(src):
+    return tuple(src.scales), tuple(src.offsets)
+
+
+def build_vrt(paths):
+    """VRT XML mosaicking the scenes, all on the CRS, resolution, band count, dtype and band scale/offset of the first."""
+    with rasterio.open(paths[0]) as first:
+        crs, (xres, yres), count, dtype = _profile(first)
+        nodata, (scales, offsets) = first.nodata, _scaling(first)
+        block_height, block_width = first.block_shapes[0]
+
+    scenes = []
+    for path in paths:
+        with rasterio.open(path) as src:
+            if _profile(src) != (crs, (xres, yres), count, dtype):
+                raise ValueError(f"{path} does not match {paths[0]}: mosaic scenes need the same CRS, resolution, band count and dtype.")
+            # the band scale/offset is shared by the whole mosaic, a scene stored with another one would read wrong values
+            if _scaling(src) != (scales, offsets):
+                raise ValueError(f"{path} is scaled differently from {paths[0]} (scales {src.scales} and offsets {src.offsets}, "
+                                 f"not {scales} and {offsets}): mosaic scenes need the same band scale and offset.")
+            scenes.append((os.path.abspath(path), src.bounds, src.width, src.height, src.nodata))
+
+    left = min(bounds.left for _, bounds, _, _, _ in scenes)
+    top = max(bounds.top for _, bounds, _, _, _ in scenes)
+    right = max(bounds.right for _, bounds, _, _, _ in scenes)
+    bottom = min(bounds.bottom for _, bounds, _, _, _ in scenes)
+    width, height = round((right - left) / xres), round((top - bottom) / yres)
+
+    sources = []
+    for path, bounds, scene_width, scene_height, scene_nodata in scenes:
+        col, row = (bounds.left - left) / xres, (top - bounds.top) / yres
+        if abs(col - round(col)) > GRID_TOLERANCE or abs(row - round(row)) > GRID_TOLERANCE:
+            raise ValueError(f"{path} is not on the pixel grid of {paths[0]}.")
+        sources.append((escape(path), round(col), round(row), scene_width, scene_height, scene_nodata))
+
+    nodata_xml = f"<NoDataValue>{nodata!r}</NoDataValue>" if nodata is not None else ""
+    bands = []
+    for band in range(1, count + 1):
+        source_xml = "".join(
+            f'<ComplexSource><SourceFilename relativeToVRT="0">{path}</SourceFilename><SourceBand>{band}</SourceBand>'
+            f'<SrcRect xOff="0" yOff="0" xSize="{w}" ySize="{h}"/><DstRect xOff="{col}" yOff="{row}" xSize="{w}" ySize="{h}"/>'
+            # every scene masks its own nodata, so it does not cover the scenes below
+            + (f"<NODATA>{scene_nodata!r}</NODATA>" if scene_nodata is not None else "") + "</ComplexSource>"
+            for path, col, row, w, h, scene_nodata in sources
+        )
+        bands.append(
+            f'<VRTRasterBand dataType="{typename_fwd[dtype_rev[dtype]]}" band="{band}" blockXSize="{block_width}" blockYSize="{block_height}">'
+            f"{nodata_xml}<Offset>{offsets[band - 1]!r}</Offset><Scale>{scales[band - 1]!r}</Scale>{source_xml}</VRTRasterBand>"
+        )
+    return (
+        f'<VRTDataset rasterXSize="{width}" rasterYSize="{height}">'
+        f"<SRS>{escape(crs.to_wkt())}</SRS><GeoTransform>{left!r}, {xres!r}, 0.0, {top!r}, 0.0, {-yres!r}</GeoTransform>"
+        + "".join(bands) + "</VRTDataset>"
+    )
+
+
+@contextmanager
+def open_mosaic(paths, name=None):
+    """Yields the path of an in-memory VRT mosaic of the scenes, valid until the block ends.
+
+    A single path is yielded unchanged. Outputs derive their names from `name`
+    (by default mosaic_name of the scenes).
+    """
+    if len(paths) == 1:
+        yield paths[0]
+        return
+    with MemoryFile(build_vrt(paths).encode(), filename=f"{name or mosaic_name(paths)}.vrt", ext=".vrt") as memfile:
+        yield memfile.name
@@ -0,0 +1,126 @@
+import os
+import argparse
+from contextlib import ExitStack
+import numpy as np
+import rasterio
+from tqdm import tqdm
+
+from auto_label import (
+    NDVI_THRESHOLD, NDWI_THRESHOLD, NDBI_THRESHOLD,
+    IndexStats, calculate_indices, classify_indices, iter_windows,
+)
+from rad_calc import read_from_mtl, dn_to_radiance
+from raster_io import BLOCKSIZE_DEFAULT, COMPRESS_DEFAULT, COMPRESSIONS, open_cog
+from encoder import Encoder
+from sketch import QuantileSketch
+from splitter import WIDTH_DEFAULT, HEIGHT_DEFAULT, LANDSAT_RGB_BANDS, PNG_BANDS_DEFAULT, tile_windows, save_tile
+
+
+def read_radiance(src, window, radiance_mult, radiance_add):
+    """Reads a window of DN values and converts it to a float32 radiance cube, like process_tiff."""
+    DN = src.read(window=window)
+    radiance = np.zeros(DN.shape, dtype=np.float32)
+    for band_num in range(1, src.count + 1):
+        if band_num in radiance_mult:
+            radiance[band_num - 1] = dn_to_radiance(DN[band_num - 1], band_num, radiance_mult, radiance_add)
+    return radiance
+
+
+def run_pipeline(mtl_file, input_tiff, output_dir, ndvi_t=NDVI_THRESHOLD, ndwi_t=NDWI_THRESHOLD, ndbi_t=NDBI_THRESHOLD,
+                 tile_width=WIDTH_DEFAULT, tile_height=HEIGHT_DEFAULT, tile_format="tif", window_size=None,
+                 save_radiance=False, save_mask=False, blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT):
+    """DN -> radiance -> indices -> mask -> image/mask tiles, window by window without intermediate files.
+
+    The scene is read twice: once for the index and normalization statistics and
+    once, tile by tile, to classify and write. The full radiance and mask GeoTIFFs
+    are only written when asked for.
+    """
+    radiance_mult, radiance_add = read_from_mtl(mtl_file)
+    thresholds = (ndvi_t, ndwi_t, ndbi_t)
+    base_name = os.path.splitext(os.path.basename(input_tiff))[0]
+
+    tiles_dir = os.path.join(output_dir, "tiles")
+    masks_dir = os.path.join(output_dir, "masks")
+    os.makedirs(tiles_dir, exist_ok=True)
+    os.makedirs(masks_dir, exist_ok=True)
+
+    with rasterio.open(input_tiff) as src:
+        print(f"Processing {src.count} bands from {input_tiff} ({src.width}x{src.height})...")
+
+        # pass 1: index stats for the mask and band percentiles for PNG tiles
+        index_stats = IndexStats(thresholds)
+        band_sketches = [QuantileSketch() for _ in PNG_BANDS_DEFAULT]
+        for window in tqdm(list(iter_windows(src, window_size)), desc="Scanning", unit="window"):
+            radiance = read_radiance(src, window, radiance_mult, radiance_add)
+            index_stats.update(calculate_indices(radiance))
+            if tile_format == "png":
+                for sketch, band in zip(band_sketches, PNG_BANDS_DEFAULT):
+                    band_data = radiance[band - 1]
+                    sketch.update(band_data[band_data > 0])  # Ignore zero values
+        stats = index_stats.result()
+        global_min, global_max = None, None
+        tile_bands = PNG_BANDS_DEFAULT if tile_format == "png" else LANDSAT_RGB_BANDS
+        if tile_format == "png":
+            global_min, global_max = (np.array(v) for v in zip(*(s.quantile((0.02, 0.98)) for s in band_sketches)))
+
+        # optional full-size intermediates, written window by window as COGs staged on disk
+        profile = dict(height=src.height, width=src.width, crs=src.crs, transform=src.transform)
+        with ExitStack() as outputs:
+            radiance_dst = mask_dst = encoder = None
+            if tile_format == "png":
+                # PNG tiles are compressed on a thread pool while the next tile is classified
+                encoder = outputs.enter_context(Encoder("png"))
+            if save_radiance:
+                radiance_dst = outputs.enter_context(open_cog(os.path.join(output_dir, f"{base_name}_rad.tif"), dict(profile, count=src.count, dtype=np.float32),
+                                                              blocksize, compress, in_memory=False))
+            if save_mask:
+                mask_dst = outputs.enter_context(open_cog(os.path.join(output_dir, f"{base_name}_mm.tif"), dict(profile, count=1, dtype=np.uint8),
+                                                          blocksize, compress, resampling="mode", in_memory=False))
+
+            # pass 2: classify and write tile by tile
+            for i, j, window in tqdm(list(tile_windows(src.width, src.height, tile_width, tile_height)), desc="Tiling", unit="tile"):
+                radiance = read_radiance(src, window, radiance_mult, radiance_add)
+                mask = classify_indices(calculate_indices(radiance), stats, *thresholds)
+                tile_transform = src.window_transform(window)
+
+                tile_data = radiance[[band - 1 for band in tile_bands]]
+                save_tile(tile_data, tiles_dir, f"tile_{i}_{j}", tile_format, src.crs, tile_transform, global_min, global_max,
+                          blocksize=blocksize, compress=compress, encoder=encoder)
+                # masks are always GeoTIFF tiles so they keep their georeferencing
+                save_tile(mask[np.newaxis], masks_dir, f"tile_{i}_{j}", "tif", src.crs, tile_transform,
+                          blocksize=blocksize, compress=compress, resampling="mode")
+
+                if radiance_dst is not None:
+                    radiance_dst.write(radiance, window=window)
+                if mask_dst is not None:
+                    mask_dst.write(mask, 1, window=window)
+
+        if save_radiance:
+            print(f"✅ Saved: {base_name}_rad.tif")
+        if save_mask:
+            print(f"✅ Saved: {base_name}_mm.tif")
+
+    print("✅ Pipeline completed!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Landsat 8 DN GeoTIFF to radiance, multiclass mask and tiles in one pass, without intermediate files.")
+    parser.add_argument("mtl_file", type=str, help="Path to the MTL JSON file.")
+    parser.add_argument("input_tiff", type=str, help="Path to the multi-band DN TIFF image.")
+    parser.add_argument("output_dir", type=str, help="Directory for the tiles/ and masks/ folders.")
+    parser.add_argument("--ndvi", type=float, default=NDVI_THRESHOLD, help="NDVI threshold.")
+    parser.add_argument("--ndwi", type=float, default=NDWI_THRESHOLD, help="NDWI threshold.")
+    parser.add_argument("--ndbi", type=float, default=NDBI_THRESHOLD, help="NDBI threshold.")
+    parser.add_argument("-width", type=int, default=WIDTH_DEFAULT, help=f"Tile width in pixels (default: {WIDTH_DEFAULT})")
+    parser.add_argument("-height", type=int, default=HEIGHT_DEFAULT, help=f"Tile height in pixels (default: {HEIGHT_DEFAULT})")
+    parser.add_argument("-format", choices=['tif', 'png'], default='tif', help="Image tile format: 'tif' or 'png' (default: 'tif')")
+    parser.add_argument("--window", type=int, default=0, help="Window size in pixels for the statistics pass (default: the raster's internal blocks).")
+    parser.add_argument("--save-radiance", action="store_true", help="Also write the full radiance GeoTIFF.")
+    parser.add_argument("--save-mask", action="store_true", help="Also write the full multiclass mask GeoTIFF.")
+    parser.add_argument("--blocksize", type=int, default=BLOCKSIZE_DEFAULT, help=f"Internal tile size of GeoTIFF outputs (default: {BLOCKSIZE_DEFAULT}).")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=COMPRESS_DEFAULT, help=f"GeoTIFF compression (default: {COMPRESS_DEFAULT}).")
+    args = parser.parse_args()
+
+    run_pipeline(args.mtl_file, args.input_tiff, args.output_dir, args.ndvi, args.ndwi, args.ndbi,
+                 args.width, args.height, args.format, args.window, args.save_radiance, args.save_mask,
+                 args.blocksize, args.compress)
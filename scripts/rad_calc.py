@@ -4,6 +4,9 @@ import json
 import argparse
 from pathlib import Path
 
+import instrument
+from raster_io import BLOCKSIZE_DEFAULT, COMPRESS_DEFAULT, COMPRESSIONS, open_cog
+
 def read_from_mtl(mtl_file):
     """Reads radiance scaling factors from the MTL JSON file."""
     with open(mtl_file, "r") as f:
@@ -27,8 +30,35 @@ def read_from_mtl(mtl_file):
 
     return radiance_mult, radiance_add
 
-def process_tiff(mtl_file, input_tiff, output_tiff):
-    """Converts a multi-band Landsat 8 TIFF to radiance and saves all bands in a single TIFF."""
+def dn_to_radiance(DN, band_num, radiance_mult, radiance_add):
+    """Converts DN values of one band to radiance."""
+    return radiance_mult[band_num] * DN + radiance_add[band_num]
+
+# Output storage types, float16 is written as float32 with NBITS=16 (half floats)
+OUTPUT_DTYPES = ["float32", "float16", "int16", "uint16"]
+
+def integer_scaling(band_num, radiance_mult, radiance_add, dn_dtype, out_dtype):
+    """Scale and offset that map the whole DN range of dn_dtype onto out_dtype.
+
+    Returns (step, scale, offset) with stored = (DN - DN_min) / step + out_min and
+    radiance = stored * scale + offset. For uint16 DN the step is 1, so int16 and
+    uint16 output keep every DN value exactly.
+    """
+    if not np.issubdtype(dn_dtype, np.integer):
+        raise ValueError(f"Scaled integer output needs integer DN input, got {dn_dtype}.")
+    dn_info, out_info = np.iinfo(dn_dtype), np.iinfo(out_dtype)
+    step = max(1.0, (float(dn_info.max) - dn_info.min) / (float(out_info.max) - out_info.min))
+    scale = radiance_mult[band_num] * step
+    offset = dn_to_radiance(dn_info.min, band_num, radiance_mult, radiance_add) - scale * out_info.min
+    return step, scale, offset
+
+def process_tiff(mtl_file, input_tiff, output_tiff, dtype="float32", compress=COMPRESS_DEFAULT, blocksize=BLOCKSIZE_DEFAULT):
+    """Converts a multi-band Landsat 8 TIFF to radiance and saves all bands in a single Cloud Optimized GeoTIFF.
+
+    dtype "int16"/"uint16" stores scaled integers with the scale and offset in the
+    GeoTIFF band metadata, "float16" stores half floats. Readers that go through
+    raster_io.read_scaled get float32 radiance back in every case.
+    """
     # Read radiance scaling factors
     radiance_mult, radiance_add = read_from_mtl(mtl_file)
 
@@ -36,42 +66,55 @@ def process_tiff(mtl_file, input_tiff, output_tiff):
     output_tiff = Path(output_tiff)
 
     # Open the multi-band TIFF
-    with rasterio.open(input_tiff) as src:
+    with instrument.scene(str(input_tiff)), rasterio.open(input_tiff) as src:
         num_bands = src.count  # Get number of bands
         print(f"Processing {num_bands} bands from {input_tiff}...")
+        instrument.count(pixels=src.width * src.height)
 
-        # Initialize an empty array to store all radiance bands
-        radiance_bands = np.zeros((num_bands, src.height, src.width), dtype=np.float32)
-
-        for band_num in range(1, num_bands + 1):  # Bands are 1-based in rasterio
-            if band_num not in radiance_mult:
-                print(f"Skipping Band {band_num} (no radiance coefficients in MTL).")
-                continue
-
-            print(f"Processing Band {band_num}...")
-
-            # Read DN values
-            DN = src.read(band_num)
-
-            # Convert DN to radiance
-            radiance = radiance_mult[band_num] * DN + radiance_add[band_num]
-
-            # Store the radiance values in the array
-            radiance_bands[band_num - 1] = radiance
-
-        # Save all bands in a single multi-band GeoTIFF
-        with rasterio.open(
-            output_tiff, "w",
-            driver="GTiff",
+        profile = dict(
             height=src.height,
             width=src.width,
             count=num_bands,
-            dtype=radiance_bands.dtype,
+            dtype="float32" if dtype == "float16" else dtype,
             crs=src.crs,
             transform=src.transform
-        ) as dst:
-            for band_num in range(1, num_bands + 1):
-                dst.write(radiance_bands[band_num - 1], band_num)
+        )
+        if dtype == "float16":
+            profile["nbits"] = 16
+
+        scales = [1.0] * num_bands
+        offsets = [0.0] * num_bands
+
+        # Write band by band, only one band is held in memory. The COG writer picks
+        # the floating point predictor for floats and differencing for integers
+        with open_cog(str(output_tiff), profile, blocksize, compress) as dst:
+            for band_num in range(1, num_bands + 1):  # Bands are 1-based in rasterio
+                if band_num not in radiance_mult:
+                    print(f"Skipping Band {band_num} (no radiance coefficients in MTL).")
+                    dst.write(np.zeros((src.height, src.width), dtype=dst.dtypes[0]), band_num)
+                    continue
+
+                print(f"Processing Band {band_num}...")
+
+                # Read DN values
+                with instrument.stage("read"):
+                    DN = src.read(band_num)
+                instrument.count("read", bytes_read=DN.nbytes)
+
+                with instrument.stage("radiance"):
+                    if dtype in ("int16", "uint16"):
+                        # Store the DN range as integers, radiance = stored * scale + offset
+                        step, scales[band_num - 1], offsets[band_num - 1] = integer_scaling(band_num, radiance_mult, radiance_add, DN.dtype, dtype)
+                        stored = (DN.astype(np.int64) - np.iinfo(DN.dtype).min) / step + np.iinfo(dtype).min
+                        band_data = np.round(stored).astype(dtype)
+                    else:
+                        # Convert DN to radiance
+                        band_data = dn_to_radiance(DN, band_num, radiance_mult, radiance_add).astype(np.float32)
+                with instrument.stage("write"):
+                    dst.write(band_data, band_num)
+
+            dst.scales = scales
+            dst.offsets = offsets
 
         print(f"Saved multi-band radiance image: {output_tiff}")
 
@@ -80,7 +123,14 @@ if __name__ == "__main__":
     parser.add_argument("mtl_file", type=str, help="Path to the MTL JSON file.")
     parser.add_argument("input_tiff", type=str, help="Path to the multi-band TIFF image.")
     parser.add_argument("output_tiff", type=str, help="Path to save the output radiance GeoTIFF.")
+    parser.add_argument("--dtype", choices=OUTPUT_DTYPES, default="float32", help="Storage type: float32, float16, or int16/uint16 scaled with scale/offset metadata (default: float32).")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=COMPRESS_DEFAULT, help=f"GeoTIFF compression (default: {COMPRESS_DEFAULT}).")
+    parser.add_argument("--blocksize", type=int, default=BLOCKSIZE_DEFAULT, help=f"Internal tile size of the output COG (default: {BLOCKSIZE_DEFAULT}).")
+    parser.add_argument("--report", type=str, default=None, help="Append per stage timings of the run to this JSON lines file.")
+    parser.add_argument("--trace-memory", action="store_true", help="Also record the peak traced (numpy) memory in the --report.")
 
     args = parser.parse_args()
+    if args.report:
+        instrument.enable(args.report, args.trace_memory)
 
-    process_tiff(args.mtl_file, args.input_tiff, args.output_tiff)
+    process_tiff(args.mtl_file, args.input_tiff, args.output_tiff, args.dtype, args.compress, args.blocksize)
@@ -0,0 +1,122 @@
+"""Shared raster reading and writing helpers."""
+import os
+from contextlib import contextmanager
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.io import MemoryFile
+from rasterio.shutil import copy as rio_copy
+
+import instrument
+from manifest import atomic_path
+
+BLOCKSIZE_DEFAULT = 512
+COMPRESS_DEFAULT = "deflate"
+COMPRESSIONS = ["none", "deflate", "zstd", "lzw"]
+# rasters up to this many bytes are staged in memory before the COG copy, larger ones on disk
+IN_MEMORY_LIMIT = 256 << 20
+
+
+def read_scaled(src, indexes=None, window=None, **kwargs):
+    """Reads bands like src.read, applying the GeoTIFF scale/offset metadata when present.
+
+    Scaled bands (e.g. radiance stored as int16/uint16 by rad_calc.py) come back as
+    float32 physical values, unscaled bands are returned unchanged. Extra keyword
+    arguments (out_shape, resampling, ...) go to src.read.
+    """
+    data = src.read(indexes, window=window, **kwargs)
+    if indexes is None:
+        band_numbers = range(1, src.count + 1)
+    elif isinstance(indexes, int):
+        band_numbers = [indexes]
+    else:
+        band_numbers = indexes
+
+    scales = [src.scales[b - 1] for b in band_numbers]
+    offsets = [src.offsets[b - 1] for b in band_numbers]
+    if all(scale == 1 for scale in scales) and all(offset == 0 for offset in offsets):
+        return data
+
+    # scale in float64 one band at a time, same rounding as rad_calc's float32 output
+    scaled = np.empty(data.shape, dtype=np.float32)
+    bands = data[np.newaxis] if isinstance(indexes, int) else data
+    out_bands = scaled[np.newaxis] if isinstance(indexes, int) else scaled
+    for out, band, scale, offset in zip(out_bands, bands, scales, offsets):
+        out[...] = band * scale + offset
+    return scaled
+
+
+def preview_shape(src, max_size):
+    """(height, width) of src scaled down so the longest side is at most max_size pixels."""
+    scale = max(src.width, src.height) / max_size if max_size else 1
+    if scale <= 1:
+        return src.height, src.width
+    return max(1, round(src.height / scale)), max(1, round(src.width / scale))
+
+
+def overview_levels(width, height, blocksize=BLOCKSIZE_DEFAULT):
+    """Decimation factors 2, 4, 8, ... until the smallest overview fits in one block."""
+    levels = []
+    factor = 2
+    while max(width, height) / (factor // 2) > blocksize:
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+@contextmanager
+def open_cog(path, profile, blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT, resampling="average", in_memory=None):
+    """Opens a dataset for writing that is saved as a Cloud Optimized GeoTIFF when the block exits.
+
+    The data is written to an internally tiled staging GeoTIFF (in memory when
+    small enough), overviews are built with `resampling` ("average" for imagery,
+    "mode" or "nearest" for class masks) and the result is copied with the COG
+    driver, which compresses it and puts the overviews in front of the data.
+    `in_memory=False` forces staging on disk, for callers that bound their memory.
+    Outputs that fit in one block (tiles, small masks) get no overviews and are
+    written as a plain tiled GeoTIFF right away instead of being staged and
+    copied: same block size, compression, predictor and pixel interleaving, but
+    not a COG (no LAYOUT=COG, the IFD is at the end of the file).
+    The file only appears under `path` once it is complete.
+    """
+    profile = dict(profile, driver="GTiff", tiled=True, blockxsize=blocksize, blockysize=blocksize)
+    for key in ("compress", "predictor"):
+        profile.pop(key, None)
+    options = dict(BLOCKSIZE=blocksize, OVERVIEWS="FORCE_USE_EXISTING", COMPRESS=compress.upper())
+    if compress != "none":
+        options["PREDICTOR"] = "YES"
+    if "nbits" in profile:
+        options["NBITS"] = profile["nbits"]
+
+    if profile["width"] <= blocksize and profile["height"] <= blocksize:
+        # the interleaving and predictor the COG driver uses
+        predictor = 3 if np.dtype(profile["dtype"]).kind == "f" else 2
+        direct = dict(compress=compress, interleave="pixel", **({"predictor": predictor} if compress != "none" else {}))
+        with atomic_path(path) as tmp:
+            with rasterio.open(tmp, "w", **profile, **direct) as dst:
+                yield dst
+                with instrument.stage("cog"):
+                    dst.close()
+        instrument.count("cog", bytes_written=os.path.getsize(path))
+        return
+
+    if in_memory is None:
+        in_memory = profile["width"] * profile["height"] * profile["count"] * np.dtype(profile["dtype"]).itemsize <= IN_MEMORY_LIMIT
+    memfile = MemoryFile() if in_memory else None
+    staging = memfile.name if memfile is not None else f"{path}.staging.tif"
+    try:
+        dst = memfile.open(**profile) if memfile is not None else rasterio.open(staging, "w", **profile)
+        with dst:
+            yield dst
+            with instrument.stage("overviews"):
+                levels = overview_levels(dst.width, dst.height, blocksize)
+                if levels:
+                    dst.build_overviews(levels, Resampling[resampling])
+        with instrument.stage("cog"), atomic_path(path) as tmp:
+            rio_copy(staging, tmp, driver="COG", **options)
+        instrument.count("cog", bytes_written=os.path.getsize(path))
+    finally:
+        if memfile is not None:
+            memfile.close()
+        elif os.path.exists(staging):
+            os.remove(staging)
@@ -0,0 +1,53 @@
+"""Rule table classification of index images.
+
+A rule table is an ordered list of Rule(class_id, index, comparator, threshold);
+a pixel gets the class of the first rule it matches, or the background class.
+The mask is filled chunk by chunk: within a chunk the rules are applied from
+the lowest to the highest priority, each one a comparison into a small reused
+buffer and a masked copy, so no full-size boolean arrays are made and more
+classes only add one comparison per chunk.
+"""
+import json
+from collections import namedtuple
+import numpy as np
+
+from spectral import CHUNK_PIXELS
+
+Rule = namedtuple("Rule", ["class_id", "index", "comparator", "threshold"])
+
+COMPARATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+
+def load_rules(path):
+    """Reads a rule table from a JSON list of [class_id, index, comparator, threshold] entries, highest priority first."""
+    with open(path) as f:
+        return [Rule(*rule) for rule in json.load(f)]
+
+
+def classify(indices, rules, background=0, chunk_pixels=CHUNK_PIXELS):
+    """uint8 class mask from a dict of same-shape index arrays and an ordered rule table."""
+    rules = [Rule(*rule) for rule in rules]
+    for rule in rules:
+        if rule.comparator not in COMPARATORS:
+            raise ValueError(f"Unknown comparator {rule.comparator!r}, use one of {list(COMPARATORS)}.")
+        if rule.index not in indices:
+            raise ValueError(f"Rule for class {rule.class_id} needs index {rule.index!r}, which was not given.")
+
+    shape = np.shape(next(iter(indices.values())))
+    flat = {name: np.ravel(indices[name]) for name in {rule.index for rule in rules}}
+    mask = np.full(int(np.prod(shape)), background, dtype=np.uint8)
+    hit = np.empty(min(chunk_pixels, mask.size), dtype=bool)
+
+    # the highest priority rule is applied last, so it wins
+    for start in range(0, mask.size, chunk_pixels):
+        stop = min(start + chunk_pixels, mask.size)
+        out, matches = mask[start:stop], hit[:stop - start]
+        for rule in reversed(rules):
+            COMPARATORS[rule.comparator](flat[rule.index][start:stop], rule.threshold, out=matches)
+            np.copyto(out, rule.class_id, where=matches)
+    return mask.reshape(shape)
@@ -0,0 +1,122 @@
+"""Tile shards: a few large tar files instead of one file per tile.
+
+Tiles are stored as .npy members of plain tar files (readable by tar and by
+WebDataset-style loaders). An index next to the shards keeps, for every tile,
+the shard, the byte offset and size of its .npy data, its transform and its
+source scene, with each scene's CRS stored once, so any tile is read with a
+single seek. Tile keys are prefixed with their scene (`<scene>/<key>`), so one
+writer can collect the tiles of several scenes.
+"""
+import io
+import json
+import os
+import tarfile
+import threading
+import numpy as np
+from rasterio.crs import CRS
+from rasterio.transform import Affine
+
+from manifest import atomic_path
+
+SHARD_SIZE_DEFAULT = 1 << 30  # bytes per shard before starting a new one
+
+
+class ShardWriter:
+    """Appends tiles to numbered tar shards and writes `<prefix>.index.json` on close. Thread safe."""
+
+    def __init__(self, output_dir, prefix="tiles", max_shard_bytes=SHARD_SIZE_DEFAULT):
+        self.output_dir = os.path.abspath(output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.prefix = prefix
+        self.index_path = os.path.join(self.output_dir, f"{prefix}.index.json")
+        self.max_shard_bytes = max_shard_bytes
+        self.scenes = {}
+        self.tiles = []
+        self._lock = threading.Lock()
+        self._tar = None
+        self._shard = -1
+
+    def write(self, key, tile_data, transform, crs, scene):
+        """Adds a (bands, height, width) tile under `<scene>/<key>`, returns its index entry."""
+        key = f"{scene}/{key}"
+        # encode outside the lock, only the append is serialized
+        buffer = io.BytesIO()
+        np.save(buffer, tile_data)
+        payload = buffer.getvalue()
+
+        with self._lock:
+            if self._tar is None or self._tar.offset + len(payload) > self.max_shard_bytes:
+                self._next_shard()
+            info = tarfile.TarInfo(f"{key}.npy")
+            info.size = len(payload)
+            self._tar.addfile(info, io.BytesIO(payload))
+            # the data is padded to whole 512 byte blocks and ends where the tar offset is now
+            blocks = (info.size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE
+            offset = self._tar.offset - blocks * tarfile.BLOCKSIZE
+
+            if scene not in self.scenes:
+                self.scenes[scene] = {"crs": crs.to_wkt() if crs else None}
+            entry = {
+                "key": key,
+                "shard": os.path.basename(self._tar.name),
+                "offset": offset,
+                "size": info.size,
+                "transform": list(transform)[:6],
+                "scene": scene,
+            }
+            self.tiles.append(entry)
+        return entry
+
+    def _next_shard(self):
+        if self._tar is not None:
+            self._tar.close()
+        self._shard += 1
+        self._tar = tarfile.open(os.path.join(self.output_dir, f"{self.prefix}-{self._shard:06d}.tar"), "w")
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+        with atomic_path(self.index_path) as tmp, open(tmp, "w") as f:
+            json.dump({"scenes": self.scenes, "tiles": self.tiles}, f)
+        return self.index_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardReader:
+    """Random access to the tiles listed in a shard index."""
+
+    def __init__(self, index_path):
+        self.root = os.path.dirname(os.path.abspath(index_path))
+        with open(index_path) as f:
+            index = json.load(f)
+        self.scenes = index["scenes"]
+        self.tiles = index["tiles"]
+        self._files = {}
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __getitem__(self, i):
+        """The (bands, height, width) array of tile i."""
+        entry = self.tiles[i]
+        f = self._files.get(entry["shard"])
+        if f is None:
+            f = self._files[entry["shard"]] = open(os.path.join(self.root, entry["shard"]), "rb")
+        f.seek(entry["offset"])
+        return np.load(io.BytesIO(f.read(entry["size"])))
+
+    def georeference(self, i):
+        """(transform, crs, scene) of tile i."""
+        entry = self.tiles[i]
+        crs = self.scenes[entry["scene"]]["crs"]
+        return Affine(*entry["transform"]), CRS.from_wkt(crs) if crs else None, entry["scene"]
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
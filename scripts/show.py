@@ -3,29 +3,40 @@ import os
 import rasterio
 import numpy as np
 import rasterio.plot as plt
+from rasterio.enums import Resampling
 
+from raster_io import preview_shape, read_scaled
+from spectral import SENSOR_BANDS, SENSOR_DEFAULT, sensor_rgb
 
+# Longest side of the preview in pixels, about a laptop screen
+DISPLAY_SIZE = 1600
+
+
+# Normalize to 0-1 in place
 def normalize(array):
-    return (array - array.min()) / (array.max() - array.min())
+    array -= array.min()
+    array /= array.max()
+    return array
 
 
-def show_tif(image_path, red_band, green_band, blue_band):
-    """Loads and displays a GeoTIFF image using Rasterio and Matplotlib."""
+def show_tif(image_path, red_band, green_band, blue_band, max_size=DISPLAY_SIZE):
+    """Loads and displays a GeoTIFF image using Rasterio and Matplotlib.
+
+    The bands are read at display resolution (from overviews when the file has
+    them), max_size=0 reads the full resolution.
+    """
     if not os.path.exists(image_path):
         print(f"Error: File '{image_path}' not found.")
         return
 
     with rasterio.open(image_path) as src:
         # Plot image
-        red = src.read(red_band)
-        green = src.read(green_band)
-        blue = src.read(blue_band)
-        
-        red_norm = normalize(red)
-        green_norm = normalize(green)
-        blue_norm = normalize(blue)
-
-        rgb = np.stack((red_norm, green_norm, blue_norm))
+        height, width = preview_shape(src, max_size)
+        rgb = read_scaled(src, [red_band, green_band, blue_band], out_shape=(3, height, width),
+                          resampling=Resampling.average).astype(np.float32, copy=False)
+
+        for band in rgb:
+            normalize(band)
  
         plt.show(rgb)
 
@@ -33,10 +44,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Display a GeoTIFF image.")
     parser.add_argument("image_path", help="Path to the GeoTIFF file")
 
-    parser.add_argument("-r", type=int, default=4, help="Band number for Red channel")
-    parser.add_argument("-g",type=int, default=3, help="Band number for Green channel")
-    parser.add_argument("-b", type=int, default=2, help="Band number for Blue channel")
+    parser.add_argument("-r", type=int, default=None, help="Band number for Red channel (default: from --sensor)")
+    parser.add_argument("-g",type=int, default=None, help="Band number for Green channel (default: from --sensor)")
+    parser.add_argument("-b", type=int, default=None, help="Band number for Blue channel (default: from --sensor)")
+    parser.add_argument("--sensor", choices=list(SENSOR_BANDS), default=SENSOR_DEFAULT, help=f"Band layout of the image (default: {SENSOR_DEFAULT})")
+    parser.add_argument("--max-size", type=int, default=DISPLAY_SIZE, help=f"Longest side of the preview in pixels, 0 for full resolution (default: {DISPLAY_SIZE})")
 
     args = parser.parse_args()
 
-    show_tif(args.image_path, args.r, args.g, args.b)
+    red, green, blue = sensor_rgb(args.sensor)
+    show_tif(args.image_path, args.r or red, args.g or green, args.b or blue, args.max_size)
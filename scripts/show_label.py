@@ -1,11 +1,14 @@
 import numpy as np
-import rasterio
-import cv2
 import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap
 import argparse
 import os
 
+from mask_io import read_mask
+
+# Longest side of the preview in pixels, about a laptop screen
+DISPLAY_SIZE = 1600
+
 # Class values
 BACKGROUND = 0
 VEGETATION = 1
@@ -23,23 +26,19 @@ def visualize_mask(mask):
     plt.axis("off")
     plt.show()
 
-def load_mask(path):
-    if path.endswith('.tif'):
-        with rasterio.open(path) as src:
-            return src.read(1)  # First band
-    elif path.endswith('.png'):
-        return cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-    else:
-        raise ValueError("Unsupported file format. Use .tif or .png.")
+# Load a mask (.tif, .png or .npy, see mask_io.py), max_size limits the longest side for previews (None for full resolution)
+def load_mask(path, max_size=None):
+    return read_mask(path, max_size)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Visualize a multiclass mask.")
-    parser.add_argument("mask_path", type=str, help="Path to the mask file (.tif or .png)")
+    parser.add_argument("mask_path", type=str, help="Path to the mask file (.tif, .png or .npy)")
+    parser.add_argument("--max-size", type=int, default=DISPLAY_SIZE, help=f"Longest side of the preview in pixels, 0 for full resolution (default: {DISPLAY_SIZE})")
     args = parser.parse_args()
 
     if not os.path.exists(args.mask_path):
         print("❌ Mask file not found.")
         exit()
 
-    mask = load_mask(args.mask_path)
+    mask = load_mask(args.mask_path, args.max_size)
     visualize_mask(mask)
@@ -0,0 +1,146 @@
+"""Mergeable streaming quantile sketch.
+
+QuantileSketch keeps a histogram of bins of bounded relative width (as in
+DDSketch), so any quantile it returns is within `relative_accuracy` of the value
+at that rank. The bins are float32 bit patterns with the low mantissa bits
+dropped: every power of two is split into 2**bits equal bins and the bin of a
+value is a shift of its bits, counted with one np.bincount. Memory only depends
+on the value range, not on the number of values, and two sketches built with
+the same accuracy are merged by adding their bin counts, so windows and worker
+processes can be sketched independently.
+Values are sketched as float32, magnitudes beyond its range count as inf.
+"""
+import numpy as np
+
+DEFAULT_ACCURACY = 1e-3
+# values closer to zero than this are counted as zero
+MIN_VALUE = 1e-9
+# values handled per update step, bounds the temporaries
+CHUNK_SIZE = 1 << 20
+MANTISSA_BITS = 23
+SIGN_BIT = 1 << 31
+# bit pattern of float32 inf, NaN lies above it
+INF_BITS = 0x7F800000
+
+
+class _Store:
+    """Dense bin counts starting at bin key `offset`."""
+
+    def __init__(self):
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, counts, offset=0):
+        """Add dense bin counts starting at bin key `offset`."""
+        nonzero = np.flatnonzero(counts)
+        if nonzero.size == 0:
+            return
+        lo, hi = int(nonzero[0]), int(nonzero[-1])
+        self._extend(offset + lo, offset + hi)
+        start = offset + lo - self.offset
+        self.counts[start:start + hi - lo + 1] += counts[lo:hi + 1]
+
+    def merge(self, other):
+        self.add(other.counts, other.offset)
+
+    def _extend(self, lo, hi):
+        if self.counts.size == 0:
+            self.offset = lo
+            self.counts = np.zeros(hi - lo + 1, dtype=np.int64)
+            return
+        new_lo = min(lo, self.offset)
+        new_hi = max(hi, self.offset + self.counts.size - 1)
+        if new_lo == self.offset and new_hi - new_lo + 1 == self.counts.size:
+            return
+        counts = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+        counts[self.offset - new_lo:self.offset - new_lo + self.counts.size] = self.counts
+        self.offset, self.counts = new_lo, counts
+
+
+class QuantileSketch:
+    """Fixed-memory quantile estimator with bounded relative error. NaN and inf are ignored."""
+
+    def __init__(self, relative_accuracy=DEFAULT_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        # a bin is at most 2**-bits of its lower edge wide, its midpoint is within half of that
+        bits = int(np.clip(np.ceil(np.log2(1 / (2 * relative_accuracy))), 0, MANTISSA_BITS))
+        self._shift = MANTISSA_BITS - bits
+        self._zero_key = int(np.float32(MIN_VALUE).view(np.uint32)) >> self._shift
+        self._inf_key = INF_BITS >> self._shift
+        self.positive = _Store()
+        self.negative = _Store()
+        self.zero_count = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """Add an array of values (any shape) to the sketch."""
+        values = np.asarray(values).ravel()
+        for start in range(0, values.size, CHUNK_SIZE):
+            with np.errstate(over="ignore"):
+                chunk = values[start:start + CHUNK_SIZE].astype(np.float32, copy=False)
+            # sign bit, exponent and the kept mantissa bits: positive bins first, then negative ones
+            counts = np.bincount(chunk.view(np.uint32) >> self._shift)
+            half = SIGN_BIT >> self._shift
+            finite = 0
+            for store, magnitudes in ((self.positive, counts[:half]), (self.negative, counts[half:])):
+                zeros = int(magnitudes[:self._zero_key].sum())
+                magnitudes = magnitudes[self._zero_key:self._inf_key]
+                store.add(magnitudes, self._zero_key)
+                self.zero_count += zeros
+                finite += zeros + int(magnitudes.sum())
+            if finite == 0:
+                continue
+            self.count += finite
+            lo, hi = chunk.min(), chunk.max()
+            if not (np.isfinite(lo) and np.isfinite(hi)):
+                chunk = chunk[np.isfinite(chunk)]
+                lo, hi = chunk.min(), chunk.max()
+            self.min = min(self.min, float(lo))
+            self.max = max(self.max, float(hi))
+        return self
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy.")
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 <= q <= 1), or a list of them. NaN for an empty sketch."""
+        if np.ndim(q):
+            return [self.quantile(x) for x in q]
+        if self.count == 0:
+            return np.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        # same rank convention as np.percentile
+        rank = q * (self.count - 1)
+        # ascending order: most negative bins first, then zero, then positive bins
+        negative = self.negative.counts[::-1].cumsum()
+        below = int(negative[-1]) if negative.size else 0
+        if rank < below:
+            i = int(np.searchsorted(negative, rank, side="right"))
+            value = -self._value(self.negative.offset + self.negative.counts.size - 1 - i)
+        elif rank < below + self.zero_count:
+            value = 0.0
+        else:
+            positive = self.positive.counts.cumsum()
+            i = min(int(np.searchsorted(positive, rank - below - self.zero_count, side="right")), positive.size - 1)
+            value = self._value(self.positive.offset + i)
+        return min(max(value, self.min), self.max)
+
+    def _value(self, key):
+        # midpoint of the bin, its edges are the float32 values of the key's bit patterns
+        lower, upper = (np.array([key, key + 1], dtype=np.uint32) << self._shift).view(np.float32)
+        return (float(lower) + float(upper)) / 2
@@ -0,0 +1,207 @@
+"""Fused spectral index engine.
+
+Indices are requested by name (see INDEX_EXPRESSIONS) or as simple band math
+over logical band names, e.g. "(nir - red) / (nir + red)". All requested
+indices are compiled into one plan in which shared sums and differences are
+evaluated once, then evaluated in float32 row chunks with in-place numpy ops.
+"""
+import ast
+import numpy as np
+
+# logical band name -> 0-based index in a Landsat 8 band cube
+LANDSAT8_BANDS = {
+    "coastal": 0,  # Band 1
+    "blue": 1,     # Band 2
+    "green": 2,    # Band 3
+    "red": 3,      # Band 4
+    "nir": 4,      # Band 5
+    "swir1": 5,    # Band 6
+    "swir2": 6,    # Band 7
+}
+
+# logical band name -> 0-based index in the band stack of a Sentinel-2 product,
+# B01-B12 in band order with B8A after B08 (L2A has no B10)
+SENTINEL2_L1C_BANDS = {
+    "coastal": 0,       # B01
+    "blue": 1,          # B02
+    "green": 2,         # B03
+    "red": 3,           # B04
+    "rededge1": 4,      # B05
+    "rededge2": 5,      # B06
+    "rededge3": 6,      # B07
+    "nir": 7,           # B08
+    "nir_narrow": 8,    # B8A
+    "water_vapour": 9,  # B09
+    "cirrus": 10,       # B10
+    "swir1": 11,        # B11
+    "swir2": 12,        # B12
+}
+SENTINEL2_L2A_BANDS = {name: index - (index > 10) for name, index in SENTINEL2_L1C_BANDS.items() if name != "cirrus"}
+
+# sensor profiles, the band mapping of each supported product
+SENSOR_BANDS = {
+    "landsat8": LANDSAT8_BANDS,
+    "landsat9": LANDSAT8_BANDS,  # OLI-2 keeps the OLI band order
+    "sentinel2-l1c": SENTINEL2_L1C_BANDS,
+    "sentinel2-l2a": SENTINEL2_L2A_BANDS,
+}
+SENSOR_DEFAULT = "landsat8"
+
+# named indices, expressions may refer to other named indices
+INDEX_EXPRESSIONS = {
+    "ndvi": "(nir - red) / (nir + red)",
+    "ndwi": "(green - swir1) / (green + swir1)",
+    "ndbi": "(swir1 - nir) / (swir1 + nir + 1e-6)",
+    "mndwi": "(green - swir1) / (green + swir1 + 1e-6)",
+    "ui": "((swir1 + red) - (nir + blue)) / ((swir1 + red) + (nir + blue) + 1e-6)",
+    # IBI uses an NDVI with epsilon, unlike the plain ndvi above
+    "ibi": "(ndbi - ((nir - red) / (nir + red + 1e-6) + mndwi)) / (ndbi + ((nir - red) / (nir + red + 1e-6) + mndwi) + 1e-6)",
+}
+
+# pixels evaluated per chunk, keeps the temporaries small and cache friendly
+CHUNK_PIXELS = 1 << 18
+
+_BINARY_OPS = {
+    ast.Add: ("add", np.add),
+    ast.Sub: ("sub", np.subtract),
+    ast.Mult: ("mul", np.multiply),
+    ast.Div: ("div", np.divide),
+}
+_UFUNCS = {name: ufunc for name, ufunc in _BINARY_OPS.values()}
+_COMMUTATIVE = ("add", "mul")
+
+
+def _parse(expression, bands, seen=()):
+    """Parse an expression into a canonical tuple tree."""
+    if expression in INDEX_EXPRESSIONS:
+        if expression in seen:
+            raise ValueError(f"Recursive index definition: {expression}")
+        return _parse(INDEX_EXPRESSIONS[expression], bands, seen + (expression,))
+    try:
+        tree = ast.parse(expression, mode="eval").body
+    except SyntaxError:
+        raise ValueError(f"Invalid index expression: {expression!r}")
+    return _convert(tree, bands, seen)
+
+
+def _convert(node, bands, seen):
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        op = _BINARY_OPS[type(node.op)][0]
+        left = _convert(node.left, bands, seen)
+        right = _convert(node.right, bands, seen)
+        if left[0] == "const" and right[0] == "const":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return ("const", float(_UFUNCS[op](left[1], right[1])))
+        # a + b and b + a are the same term (exactly, in IEEE arithmetic)
+        if op in _COMMUTATIVE and repr(right) < repr(left):
+            left, right = right, left
+        return (op, left, right)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _convert(node.operand, bands, seen)
+        if operand[0] == "const":
+            return ("const", -operand[1])
+        return ("neg", operand)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return ("const", float(node.value))
+    if isinstance(node, ast.Name):
+        if node.id in bands:
+            return ("band", node.id)
+        if node.id in INDEX_EXPRESSIONS:
+            return _parse(node.id, bands, seen)
+        raise ValueError(f"Unknown band or index: {node.id}")
+    raise ValueError(f"Unsupported syntax in index expression: {ast.dump(node)}")
+
+
+class IndexPlan:
+    """A compiled set of indices that can be evaluated over many band cubes."""
+
+    def __init__(self, indices, bands=LANDSAT8_BANDS):
+        self.names = list(indices)
+        self.bands = dict(bands)
+        self.outputs = {name: _parse(name, self.bands) for name in self.names}
+
+        # unique terms in evaluation order, with the number of times each is used
+        self.steps = []
+        self.uses = {}
+        for tree in self.outputs.values():
+            self._add(tree)
+        for tree in self.outputs.values():
+            self.uses[tree] = self.uses.get(tree, 0) + 1
+
+    def _add(self, tree):
+        if tree in self.uses:
+            return
+        for child in tree[1:]:
+            if isinstance(child, tuple):
+                self._add(child)
+                self.uses[child] += 1
+        self.uses[tree] = 0
+        self.steps.append(tree)
+
+    @property
+    def bands_used(self):
+        """0-based cube indices of the bands the plan reads."""
+        return sorted({self.bands[tree[1]] for tree in self.steps if tree[0] == "band"})
+
+    def compact(self):
+        """(1-based bands to read, the same plan over a cube of only those bands), for selective reads."""
+        used = self.bands_used
+        position = {band: k for k, band in enumerate(used)}
+        bands = {name: position[band] for name, band in self.bands.items() if band in position}
+        return [band + 1 for band in used], IndexPlan(self.names, bands)
+
+    def evaluate(self, image, chunk_rows=None):
+        """Evaluate all indices over a (bands, height, width) cube, returns a dict of float32 arrays."""
+        height, width = image.shape[-2:]
+        if chunk_rows is None:
+            chunk_rows = max(1, CHUNK_PIXELS // max(width, 1))
+        results = {name: np.empty((height, width), dtype=np.float32) for name in self.names}
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for row in range(0, height, chunk_rows):
+                rows = slice(row, min(row + chunk_rows, height))
+                values = self._evaluate_chunk(image, rows)
+                for name, tree in self.outputs.items():
+                    results[name][rows] = values[tree]
+        return results
+
+    def _evaluate_chunk(self, image, rows):
+        values = {}
+        remaining = dict(self.uses)
+        for tree in self.steps:
+            op = tree[0]
+            if op == "band":
+                # copy to float32 first, raw uint16 bands would wrap around on subtraction
+                values[tree] = image[self.bands[tree[1]], rows].astype(np.float32)
+            elif op == "const":
+                values[tree] = np.float32(tree[1])
+            elif op == "neg":
+                values[tree] = np.negative(values[tree[1]], out=self._buffer(tree[1], values, remaining))
+            else:
+                left, right = values[tree[1]], values[tree[2]]
+                out = self._buffer(tree[1], values, remaining)
+                if out is None:
+                    out = self._buffer(tree[2], values, remaining)
+                values[tree] = _UFUNCS[op](left, right, out=out)
+            for child in tree[1:]:
+                if isinstance(child, tuple):
+                    remaining[child] -= 1
+        return values
+
+    @staticmethod
+    def _buffer(child, values, remaining):
+        # reuse a temporary in place when this is its last use
+        if isinstance(child, tuple) and remaining[child] == 1 and isinstance(values[child], np.ndarray):
+            return values[child]
+        return None
+
+
+def sensor_rgb(sensor=SENSOR_DEFAULT):
+    """1-based red, green and blue bands of a sensor profile."""
+    bands = SENSOR_BANDS[sensor]
+    return [bands[name] + 1 for name in ("red", "green", "blue")]
+
+
+def compute_indices(image, indices, bands=LANDSAT8_BANDS, chunk_rows=None):
+    """Compute several indices from a (bands, height, width) cube in one pass."""
+    return IndexPlan(indices, bands).evaluate(image, chunk_rows)
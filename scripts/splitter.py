@@ -1,104 +1,474 @@
 import os
 import argparse
+import csv
+import threading
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import rasterio
-from rasterio.windows import Window
-from rasterio.transform import Affine
+from rasterio.enums import MaskFlags
+from rasterio.windows import Window, intersection
 import numpy as np
-from PIL import Image
 from tqdm import tqdm
 
+from auto_label import iter_windows
+from encoder import IMAGE_FORMATS, Encoder, write_image, PNG_LEVEL_DEFAULT, PNG_STRATEGIES, PNG_STRATEGY_DEFAULT, QUALITY_DEFAULT
+import instrument
+from manifest import MANIFEST_NAME, Manifest, atomic_path
+from mosaic import expand_inputs, open_mosaic
+from raster_io import BLOCKSIZE_DEFAULT, COMPRESS_DEFAULT, COMPRESSIONS, open_cog, read_scaled
+from shards import ShardWriter
+from sketch import QuantileSketch
+from spectral import SENSOR_BANDS, SENSOR_DEFAULT, sensor_rgb
+
 WIDTH_DEFAULT = 1280
 HEIGHT_DEFAULT = 720
 LANDSAT_RGB_BANDS = [1, 2, 3, 4, 5, 6, 7]
+# bands written to PNG tiles: Landsat 8 red, green, blue
+PNG_BANDS_DEFAULT = sensor_rgb(SENSOR_DEFAULT)
+WORKERS_DEFAULT = min(8, os.cpu_count() or 1)
+# partial: edge tiles keep whatever size is left, pad: edge tiles are filled up
+# to full size with nodata (or 0), drop: only full tiles are written
+EDGE_POLICIES = ['partial', 'pad', 'drop']
+NAME_DEFAULT = "tile_{i}_{j}"
+# tiles with a smaller fraction of valid pixels: skip never reads them, flag writes
+# them as usual and lists them in <name>_low_valid.csv for review
+MIN_VALID_DEFAULT = 0.0
+LOW_VALID_POLICIES = ['skip', 'flag']
+# validity samples along the shorter tile side when estimating tile coverage
+COVERAGE_SAMPLES = 16
+# paired mask tiles go to this subdirectory, under the names of their image tiles
+MASK_DIR = "masks"
+# auto_label.py writes the mask of <name>.tif as <name>_mm.tif (or .png)
+MASK_SUFFIX = "_mm"
+# tif/png/webp/jpg write one file per tile, shard packs the tiles into a few tar shards (see shards.py)
+OUTPUT_FORMATS = ['tif'] + IMAGE_FORMATS + ['shard']
 
-def compute_global_percentiles(image_path):
+def compute_global_percentiles(image_path, bands=LANDSAT_RGB_BANDS):
     """Compute global 2%-98% percentile range for normalization across all tiles."""
     with rasterio.open(image_path) as src:
-        all_band_mins, all_band_maxs = [], []
-        for band in LANDSAT_RGB_BANDS:
-            band_data = src.read(band).flatten()
-            band_min, band_max = np.percentile(band_data[band_data > 0], (2, 98))  # Ignore zero values
-            all_band_mins.append(band_min)
-            all_band_maxs.append(band_max)
+        # one sketch per band, filled block by block (strips joined, see iter_windows)
+        sketches = [QuantileSketch() for _ in bands]
+        for window in iter_windows(src):
+            window_data = read_scaled(src, bands, window=window)
+            for sketch, band_data in zip(sketches, window_data):
+                sketch.update(band_data[band_data > 0])  # Ignore zero values
+        all_band_mins, all_band_maxs = zip(*(sketch.quantile((0.02, 0.98)) for sketch in sketches))
     return np.array(all_band_mins), np.array(all_band_maxs)
 
-def normalize_to_png(tile_data, global_min, global_max):
-    """Normalize tile using global min/max values computed from the whole raster."""
-    normalized_bands = []
-    for band, band_min, band_max in zip(tile_data, global_min, global_max):
-        if band_max > band_min:
-            band = np.clip((band - band_min) / (band_max - band_min) * 255, 0, 255).astype(np.uint8)
+def stretch(band, band_min, band_max):
+    """Linear 0-255 stretch of band values between band_min and band_max."""
+    if band_max > band_min:
+        return np.clip((band - band_min) / (band_max - band_min) * 255, 0, 255).astype(np.uint8)
+    return np.full(np.shape(band), 128, dtype=np.uint8)  # Assign neutral gray if no variation
+
+def build_png_lut(src, bands, global_min, global_max):
+    """Per band lookup tables from every raw 8/16 bit integer code to its stretched uint8 value.
+
+    Scale/offset metadata is applied to the codes the same way read_scaled does,
+    so the tables give exactly the float path's output. Returns None for other
+    data types, which are stretched per tile.
+    """
+    dtype = np.dtype(src.dtypes[bands[0] - 1])
+    if dtype.kind not in "iu" or dtype.itemsize > 2 or any(np.dtype(src.dtypes[b - 1]) != dtype for b in bands):
+        return None
+    # tables are indexed by the raw bits, so signed codes are looked up through an unsigned view
+    codes = np.arange(1 << (8 * dtype.itemsize), dtype=f"u{dtype.itemsize}").view(dtype)
+    lut = np.empty((len(bands), codes.size), dtype=np.uint8)
+    for out, band, band_min, band_max in zip(lut, bands, global_min, global_max):
+        scale, offset = src.scales[band - 1], src.offsets[band - 1]
+        values = codes if (scale, offset) == (1, 0) else (codes * scale + offset).astype(np.float32)
+        out[...] = stretch(values, band_min, band_max)
+    return lut
+
+def normalize_to_png(tile_data, global_min, global_max, lut=None):
+    """Normalize a 1 or 3 band tile using global min/max values computed from the whole raster.
+
+    Returns a (height, width) or (height, width, 3) uint8 image. With a lookup
+    table from build_png_lut, tile_data holds the raw integer codes and every
+    band is a single gather.
+    """
+    if tile_data.shape[0] not in (1, 3):
+        raise ValueError(f"PNG tiles need 1 or 3 bands, got {tile_data.shape[0]}.")
+    # filled band by band in (height, width, bands) order
+    image = np.empty(tile_data.shape[1:] + tile_data.shape[:1], dtype=np.uint8)
+    for k, band in enumerate(tile_data):
+        if lut is not None:
+            np.take(lut[k], band.view(f"u{band.dtype.itemsize}"), out=image[..., k], mode='clip')
         else:
-            band = np.full_like(band, 128, dtype=np.uint8)  # Assign neutral gray if no variation
-        normalized_bands.append(band)
-    
-    tile_data = np.stack(normalized_bands, axis=-1)  # Convert from (bands, height, width) to (height, width, bands)
-    return Image.fromarray(tile_data, mode='RGB')
+            image[..., k] = stretch(band, global_min[k], global_max[k])
+    return image[..., 0] if image.shape[2] == 1 else image
 
-def split_tif(image_path, output_dir, tile_width, tile_height, output_format):
-    """Splits a GeoTIFF into smaller tiles and applies cumulative count cut normalization for PNG output."""
-    
+def _tile_offsets(size, tile_size, stride, edge):
+    if edge == 'drop':
+        return list(range(0, size - tile_size + 1, stride))
+    offsets = []
+    for offset in range(0, size, stride):
+        offsets.append(offset)
+        if offset + tile_size >= size:  # this tile already reaches the edge
+            break
+    return offsets
+
+def tile_windows(width, height, tile_width, tile_height, overlap=0, edge='partial'):
+    """Yields (i, j, window) for a grid of tiles, column by column.
+
+    Neighbouring tiles share `overlap` pixels, `edge` is one of EDGE_POLICIES.
+    """
+    if not 0 <= overlap < min(tile_width, tile_height):
+        raise ValueError(f"Overlap must be between 0 and the tile size, got {overlap}.")
+    if edge not in EDGE_POLICIES:
+        raise ValueError(f"Unknown edge policy: {edge}")
+
+    x_offsets = _tile_offsets(width, tile_width, tile_width - overlap, edge)
+    y_offsets = _tile_offsets(height, tile_height, tile_height - overlap, edge)
+    for i, x in enumerate(x_offsets):
+        for j, y in enumerate(y_offsets):
+            if edge == 'pad':
+                yield i, j, Window(x, y, tile_width, tile_height)
+            else:
+                yield i, j, Window(x, y, min(tile_width, width - x), min(tile_height, height - y))
+
+def coverage_mask(src, bands, tile_width, tile_height):
+    """Decimated validity mask of the raster, returns (mask, factor) with one sample per factor x factor pixels.
+
+    Uses the dataset mask (nodata, alpha or internal masks) when there is one,
+    otherwise pixels that are 0 in every band are invalid (zero fill around
+    Landsat scenes). The reduced read comes from the overviews when there are any.
+    """
+    factor = max(1, min(tile_width, tile_height) // COVERAGE_SAMPLES)
+    out_shape = (-(-src.height // factor), -(-src.width // factor))
+    if all(flags == [MaskFlags.all_valid] for flags in src.mask_flag_enums):
+        data = src.read(bands, out_shape=(len(bands),) + out_shape)
+        return (data != 0).any(axis=0), factor
+    return src.dataset_mask(out_shape=out_shape) > 0, factor
+
+def valid_fraction(mask, factor, window):
+    """Estimated fraction of valid pixels in a window from coverage_mask, parts outside the raster count as invalid."""
+    row0, col0 = window.row_off // factor, window.col_off // factor
+    row1, col1 = -(-(window.row_off + window.height) // factor), -(-(window.col_off + window.width) // factor)
+    samples = (row1 - row0) * (col1 - col0)
+    return float(np.count_nonzero(mask[row0:row1, col0:col1])) / samples
+
+def check_alignment(src, mask_src):
+    """Raises ValueError unless the (integer) mask covers the raster pixel for pixel.
+
+    A georeferenced mask must also share the CRS and transform, PNG masks only the size.
+    """
+    if np.dtype(mask_src.dtypes[0]).kind not in "iu":
+        raise ValueError(f"Masks hold integer class values, the mask is {mask_src.dtypes[0]}.")
+    if (mask_src.width, mask_src.height) != (src.width, src.height):
+        raise ValueError(f"The mask is {mask_src.width}x{mask_src.height}, the image {src.width}x{src.height}.")
+    if mask_src.crs is not None and (mask_src.crs != src.crs or not mask_src.transform.almost_equals(src.transform)):
+        raise ValueError(f"The mask is not on the grid of the image: {mask_src.crs} {tuple(mask_src.transform)[:6]} "
+                         f"vs {src.crs} {tuple(src.transform)[:6]}.")
+
+def find_mask(image_path, mask_dir):
+    """The auto_label mask of image_path in mask_dir (<name>_mm.tif or .png), or None."""
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    for ext in ('tif', 'png'):
+        mask_path = os.path.join(mask_dir, f"{name}{MASK_SUFFIX}.{ext}")
+        if os.path.exists(mask_path):
+            return mask_path
+    return None
+
+def read_tile(src, bands, window, scaled=True):
+    """Reads a tile, parts of the window outside the raster are filled with nodata (or 0).
+
+    `scaled=False` returns the stored values without applying scale/offset metadata.
+    """
+    inner = intersection(window, Window(0, 0, src.width, src.height))
+    data = read_scaled(src, bands, window=inner) if scaled else src.read(bands, window=inner)
+    if (inner.width, inner.height) == (window.width, window.height):
+        return data
+    tile = np.full((data.shape[0], window.height, window.width), src.nodata or 0, dtype=data.dtype)
+    row, col = inner.row_off - window.row_off, inner.col_off - window.col_off
+    tile[:, row:row + inner.height, col:col + inner.width] = data
+    return tile
+
+def save_tile(tile_data, output_dir, name, output_format, crs, transform, global_min=None, global_max=None, nodata=None,
+              blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT, resampling="average", lut=None, encoder=None,
+              scales=None, offsets=None):
+    """Writes one (bands, height, width) tile as a Cloud Optimized GeoTIFF or a normalized PNG/WebP/JPEG (see normalize_to_png).
+
+    GeoTIFF tiles of stored codes get the `scales`/`offsets` of their bands.
+    Images are handed to `encoder` when given, otherwise encoded right away.
+    """
+    if output_format == 'tif':
+        tile_filename = os.path.join(output_dir, f"{name}.tif")
+        profile = dict(
+            count=tile_data.shape[0], 
+            dtype=tile_data.dtype.name, 
+            crs=crs, 
+            transform=transform, 
+            width=tile_data.shape[2], 
+            height=tile_data.shape[1],
+            nodata=nodata
+        )
+        with open_cog(tile_filename, profile, blocksize, compress, resampling) as dst, instrument.stage("write"):
+            dst.write(tile_data)
+            if scales is not None:
+                dst.scales, dst.offsets = scales, offsets
+    elif output_format in IMAGE_FORMATS:
+        tile_filename = os.path.join(output_dir, f"{name}.{output_format}")
+        with instrument.stage("normalize"):
+            image = normalize_to_png(tile_data, global_min, global_max, lut)
+        if encoder is not None:
+            encoder.submit(image, tile_filename)
+        else:
+            write_image(image, tile_filename)
+    return tile_filename
+
+def split_raster(image_path, output_dir, tile_width, tile_height, output_format='tif', overlap=0, edge='partial',
+                 bands=None, name_template=NAME_DEFAULT, workers=WORKERS_DEFAULT, shard_writer=None,
+                 blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT, rgb_bands=None, encode_options=None,
+                 manifest=None, force=False, min_valid=MIN_VALID_DEFAULT, low_valid='skip', mask_path=None):
+    """Splits a raster into tiles, reading, encoding and writing tiles on a thread pool.
+
+    `name_template` may use {name} (input file name), {i}/{j} (tile column/row)
+    and {x}/{y} (pixel offsets). Returns the list of written tile files, or of
+    shard index entries for the 'shard' format. Pass a ShardWriter to collect the
+    tiles of several scenes in the same shards, otherwise one is made per scene.
+    PNG/WebP/JPEG tiles hold `rgb_bands` (default: `bands` if it has 1 or 3
+    entries, else PNG_BANDS_DEFAULT) and are written by an Encoder made with
+    `encode_options` (level, strategy, quality).
+
+    Tiles whose estimated valid-pixel fraction (see coverage_mask) is below
+    `min_valid` are handled by `low_valid`, one of LOW_VALID_POLICIES: 'skip'
+    never reads them, 'flag' writes them and lists them in <name>_low_valid.csv.
+
+    With `mask_path` (a class mask on the same grid, see check_alignment), every
+    tile is written together with its mask tile, read in the same pass: the mask
+    tiles go to MASK_DIR under the same names (GeoTIFF for 'tif' output, else
+    lossless PNG), the returned list gets them after the image tiles and
+    <name>_classes.csv lists the class histogram of every pair.
+
+    With a Manifest, a scene whose tiles are current for these parameters is not
+    split again (unless `force`) and the written tiles are recorded. Shards are
+    not tracked.
+    """
     output_dir = os.path.abspath(output_dir)
     os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(image_path))[0]
 
-    global_min, global_max = compute_global_percentiles(image_path)
-    print(f"Global min: {global_min}, Global max: {global_max}")
-    
     with rasterio.open(image_path) as src:
         width, height = src.width, src.height
-        print(f"Image size: {width}x{height}")
-        
-        num_tiles_x = width // tile_width
-        num_tiles_y = height // tile_height
-        extra_width = width % tile_width
-        extra_height = height % tile_height
-        transform = src.transform
-        
-        total_tiles = (num_tiles_x + (1 if extra_width else 0)) * (num_tiles_y + (1 if extra_height else 0))
-        progress_bar = tqdm(total=total_tiles, desc="Processing tiles", unit="tile")
-        
-        for i in range(num_tiles_x + (1 if extra_width else 0)):
-            for j in range(num_tiles_y + (1 if extra_height else 0)):
-                current_tile_width = tile_width if i < num_tiles_x else extra_width
-                current_tile_height = tile_height if j < num_tiles_y else extra_height
-                if current_tile_width == 0 or current_tile_height == 0:
-                    continue
-                
-                window = Window(i * tile_width, j * tile_height, current_tile_width, current_tile_height)
-                tile_data = src.read(LANDSAT_RGB_BANDS, window=window)
-                tile_transform = transform * Affine.translation(i * tile_width, j * tile_height)
-                
-                if output_format == 'tif':
-                    tile_filename = os.path.join(output_dir, f"tile_{i}_{j}.tif")
-                    with rasterio.open(
-                        tile_filename, 'w', 
-                        driver='GTiff', 
-                        count=len(LANDSAT_RGB_BANDS), 
-                        dtype=tile_data.dtype.name, 
-                        crs=src.crs, 
-                        transform=tile_transform, 
-                        width=current_tile_width, 
-                        height=current_tile_height
-                    ) as dst:
-                        dst.write(tile_data)
-                elif output_format == 'png':
-                    tile_filename = os.path.join(output_dir, f"tile_{i}_{j}.png")
-                    png_image = normalize_to_png(tile_data, global_min, global_max)
-                    png_image.save(tile_filename)
-                
-                progress_bar.update(1)
-        
-        progress_bar.close()
-    
+        bands = bands or list(range(1, src.count + 1))
+        if output_format in IMAGE_FORMATS:
+            bands = rgb_bands or (bands if len(bands) in (1, 3) else PNG_BANDS_DEFAULT)
+        windows = list(tile_windows(width, height, tile_width, tile_height, overlap, edge))
+        if low_valid not in LOW_VALID_POLICIES:
+            raise ValueError(f"Unknown low valid policy: {low_valid}")
+        if mask_path is not None:
+            if output_format == 'shard':
+                raise ValueError("Paired mask tiles are written as files, use the tif or an image format.")
+            with rasterio.open(mask_path) as mask_src:
+                check_alignment(src, mask_src)
+
+    tracked = manifest is not None and output_format != 'shard'
+    params = dict(tile_width=tile_width, tile_height=tile_height, output_format=output_format, overlap=overlap, edge=edge,
+                  bands=bands, name_template=name_template, blocksize=blocksize, compress=compress, encode_options=encode_options,
+                  min_valid=min_valid, low_valid=low_valid)
+    if tracked and mask_path is not None:
+        params["mask"] = manifest.input_hash(mask_path)
+    if tracked and not force and manifest.is_current(image_path, params):
+        print(f"⏩ Tiles of {image_path} are up to date.")
+        return manifest.outputs(image_path)
+
+    low_windows = []
+    if min_valid > 0:
+        # one decimated mask read for the whole scene instead of reading every tile
+        with rasterio.open(image_path) as src:
+            mask, factor = coverage_mask(src, bands, tile_width, tile_height)
+        fractions = [valid_fraction(mask, factor, window) for _, _, window in windows]
+        low_windows = [(tile, fraction) for tile, fraction in zip(windows, fractions) if fraction < min_valid]
+        if low_valid == 'skip':
+            windows = [tile for tile, fraction in zip(windows, fractions) if fraction >= min_valid]
+
+    with instrument.scene(image_path):
+        print(f"Image size: {width}x{height}, {len(windows)} tiles")
+        # partial edge tiles are only read where they overlap the raster
+        raster = Window(0, 0, width, height)
+        inners = (intersection(window, raster) for _, _, window in windows)
+        instrument.count(pixels=sum(inner.width * inner.height for inner in inners))
+        if low_windows and low_valid == 'skip':
+            print(f"Skipping {len(low_windows)} tiles with less than {min_valid:.0%} valid pixels")
+
+        global_min = global_max = lut = None
+        if output_format in IMAGE_FORMATS:
+            with instrument.stage("percentile"):
+                global_min, global_max = compute_global_percentiles(image_path, bands)
+            print(f"Global min: {global_min}, Global max: {global_max}")
+            # integer scenes are stretched once per scene through lookup tables
+            with rasterio.open(image_path) as src:
+                lut = build_png_lut(src, bands, global_min, global_max)
+
+        # datasets, encoders and an own shard writer are closed even when a tile fails:
+        # the encoders drain (or cancel) their queues, the shard index lists the tiles written
+        with ExitStack() as stack:
+            own_writer = output_format == 'shard' and shard_writer is None
+            if own_writer:
+                shard_writer = stack.enter_context(ShardWriter(output_dir, prefix=name))
+            encoder = mask_encoder = None
+            if output_format in IMAGE_FORMATS:
+                encoder = stack.enter_context(Encoder(output_format, workers, **(encode_options or {})))
+            mask_dir = os.path.join(output_dir, MASK_DIR)
+            histograms = [None] * len(windows)
+            if mask_path is not None:
+                os.makedirs(mask_dir, exist_ok=True)
+                if output_format in IMAGE_FORMATS:
+                    # class values must survive, so never JPEG or a stretch
+                    options = {key: value for key, value in (encode_options or {}).items() if key != "quality"}
+                    mask_encoder = stack.enter_context(Encoder("png", workers, **options))
+
+            # rasterio datasets are not thread safe, every worker thread opens its own
+            local = threading.local()
+            opened = []
+
+            def close_opened():
+                for src in opened:
+                    src.close()
+
+            stack.callback(close_opened)
+
+            def process(n, i, j, window):
+                if not hasattr(local, "src"):
+                    local.src = rasterio.open(image_path)
+                    opened.append(local.src)
+                    if mask_path is not None:
+                        local.mask = rasterio.open(mask_path)
+                        opened.append(local.mask)
+                src = local.src
+                with instrument.stage("read"):
+                    # GeoTIFF tiles keep the stored codes and their scale/offset, images with a lookup table stretch the codes
+                    tile_data = read_tile(src, bands, window, scaled=output_format == 'shard' or (output_format != 'tif' and lut is None))
+                instrument.count("read", bytes_read=tile_data.nbytes)
+                tile_name = name_template.format(name=name, i=i, j=j, x=window.col_off, y=window.row_off)
+                if output_format == 'shard':
+                    with instrument.stage("write"):
+                        return shard_writer.write(tile_name, tile_data, src.window_transform(window), src.crs, name)
+                tile_file = save_tile(tile_data, output_dir, tile_name, output_format, src.crs, src.window_transform(window),
+                                      global_min, global_max, src.nodata, blocksize, compress, lut=lut, encoder=encoder,
+                                      scales=[src.scales[b - 1] for b in bands], offsets=[src.offsets[b - 1] for b in bands])
+                if mask_path is None:
+                    return tile_file
+
+                with instrument.stage("read"):
+                    mask_data = read_tile(local.mask, [1], window, scaled=False)
+                instrument.count("read", bytes_read=mask_data.nbytes)
+                histograms[n] = np.bincount(mask_data.ravel())
+                if mask_encoder is None:
+                    mask_file = save_tile(mask_data, mask_dir, tile_name, 'tif', src.crs, src.window_transform(window), nodata=local.mask.nodata,
+                                          blocksize=blocksize, compress=compress, resampling="mode")
+                else:
+                    mask_file = os.path.join(mask_dir, f"{tile_name}.png")
+                    mask_encoder.submit(mask_data[0], mask_file)
+                return tile_file, mask_file
+
+            # GDAL releases the GIL while reading, compressing and writing, so threads
+            # scale; at most 2 tiles per worker are in flight to bound memory
+            tile_files = [None] * len(windows)
+            with ThreadPoolExecutor(max_workers=workers) as executor, \
+                    tqdm(total=len(windows), desc="Processing tiles", unit="tile") as progress_bar:
+                pending = {}
+                for n, (i, j, window) in enumerate(windows):
+                    if len(pending) >= 2 * workers:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            tile_files[pending.pop(future)] = future.result()
+                            progress_bar.update(1)
+                    pending[executor.submit(process, n, i, j, window)] = n
+                for future in pending:
+                    tile_files[pending[future]] = future.result()
+                    progress_bar.update(1)
+
+        if own_writer:
+            print(f"✅ Saved shard index: {shard_writer.index_path}")
+        if mask_path is not None:
+            mask_files = [mask_file for _, mask_file in tile_files]
+            tile_files = [tile_file for tile_file, _ in tile_files]
+            classes = max((histogram.size for histogram in histograms), default=0)
+            histogram_csv = os.path.join(output_dir, f"{name}_classes.csv")
+            with atomic_path(histogram_csv) as tmp, open(tmp, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["image", "mask"] + [f"class_{c}" for c in range(classes)])
+                for tile_file, mask_file, histogram in zip(tile_files, mask_files, histograms):
+                    writer.writerow([os.path.relpath(tile_file, output_dir), os.path.relpath(mask_file, output_dir)] +
+                                    list(np.pad(histogram, (0, classes - histogram.size))))
+            print(f"✅ Saved class histograms of {len(tile_files)} pairs: {histogram_csv}")
+            tile_files = tile_files + mask_files
+    if low_valid == 'flag' and low_windows:
+        flagged = os.path.join(output_dir, f"{name}_low_valid.csv")
+        with atomic_path(flagged) as tmp, open(tmp, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["tile", "x", "y", "valid_fraction"])
+            for (i, j, window), fraction in low_windows:
+                tile_name = name_template.format(name=name, i=i, j=j, x=window.col_off, y=window.row_off)
+                writer.writerow([tile_name, window.col_off, window.row_off, round(fraction, 4)])
+        print(f"⚠️ Listed {len(low_windows)} low coverage tiles in {flagged}")
+    if tracked:
+        manifest.record(image_path, params, tile_files)
+    return tile_files
+
+def split_tif(image_path, output_dir, tile_width, tile_height, output_format, overlap=0, edge='partial', workers=WORKERS_DEFAULT,
+              blocksize=BLOCKSIZE_DEFAULT, compress=COMPRESS_DEFAULT, min_valid=MIN_VALID_DEFAULT):
+    """Splits a GeoTIFF into smaller tiles and applies cumulative count cut normalization for PNG output."""
+    split_raster(image_path, output_dir, tile_width, tile_height, output_format, overlap, edge,
+                 bands=LANDSAT_RGB_BANDS, workers=workers, blocksize=blocksize, compress=compress, min_valid=min_valid)
     print("✅ Splitting completed!")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Split a GeoTIFF into smaller tiles with cumulative count cut normalization.")
-    parser.add_argument("image_path", help="Path to the input GeoTIFF file")
-    parser.add_argument("output_dir", help="Directory to save the output tiles")
+    parser.add_argument("image_path", nargs="+", help="Path to the input GeoTIFF file, or a directory of them; several files or a glob are tiled as one virtual mosaic")
+    parser.add_argument("output_dir", help="Directory to save the output tiles (one subdirectory per image for a directory)")
     parser.add_argument("-width", type=int, default=WIDTH_DEFAULT, help=f"Tile width in pixels (default: {WIDTH_DEFAULT})")
     parser.add_argument("-height", type=int, default=HEIGHT_DEFAULT, help=f"Tile height in pixels (default: {HEIGHT_DEFAULT})")
-    parser.add_argument("-format", choices=['tif', 'png'], default='tif', help="Output format: 'tif' or 'png' (default: 'tif')")
+    parser.add_argument("-format", choices=OUTPUT_FORMATS, default='tif', help="Output format: 'tif', 'png', 'webp' (lossless), 'jpg' or 'shard' (default: 'tif')")
+    parser.add_argument("-overlap", type=int, default=0, help="Pixels shared by neighbouring tiles (default: 0)")
+    parser.add_argument("-edge", choices=EDGE_POLICIES, default='partial', help="Edge tiles: keep the partial tile, pad it to full size, or drop it (default: 'partial')")
+    parser.add_argument("-bands", type=int, nargs="+", default=None, help="Bands to keep, 1-based (default: all bands)")
+    parser.add_argument("-rgb", type=int, nargs=3, default=None, help="Red, green and blue bands of PNG tiles, 1-based (default: those of -sensor)")
+    parser.add_argument("-sensor", choices=list(SENSOR_BANDS), default=SENSOR_DEFAULT, help=f"Band layout of the input, picks the PNG tile bands (default: {SENSOR_DEFAULT}, {' '.join(map(str, PNG_BANDS_DEFAULT))})")
+    parser.add_argument("-mask", default=None, help=f"Class mask on the same grid, tiled into {MASK_DIR}/ in the same pass; for a directory, a directory of <name>{MASK_SUFFIX}.tif/.png masks")
+    parser.add_argument("-name", default=NAME_DEFAULT, help=f"Tile name template, may use {{name}}, {{i}}, {{j}}, {{x}}, {{y}} (default: {NAME_DEFAULT})")
+    parser.add_argument("-png-level", type=int, default=PNG_LEVEL_DEFAULT, help=f"PNG zlib compression level 0-9 (default: {PNG_LEVEL_DEFAULT})")
+    parser.add_argument("-png-strategy", choices=list(PNG_STRATEGIES), default=PNG_STRATEGY_DEFAULT, help=f"PNG zlib strategy (default: {PNG_STRATEGY_DEFAULT})")
+    parser.add_argument("-quality", type=int, default=QUALITY_DEFAULT, help=f"JPEG quality (default: {QUALITY_DEFAULT})")
+    parser.add_argument("-min-valid", type=float, default=MIN_VALID_DEFAULT, help=f"Skip tiles with a smaller fraction of valid (not nodata / not zero fill) pixels, 0-1 (default: {MIN_VALID_DEFAULT})")
+    parser.add_argument("-low-valid", choices=LOW_VALID_POLICIES, default='skip', help="Low coverage tiles: skip them, or write them and flag them in <name>_low_valid.csv (default: 'skip')")
+    parser.add_argument("-report", default=None, help="Append per stage timings of every image to this JSON lines file")
+    parser.add_argument("-trace-memory", action="store_true", help="Also record the peak traced (numpy) memory in the -report")
+    parser.add_argument("-force", action="store_true", help=f"Split every image of a directory again, even those {MANIFEST_NAME} lists as up to date")
+    parser.add_argument("-workers", type=int, default=WORKERS_DEFAULT, help=f"Tile reader/writer threads (default: {WORKERS_DEFAULT})")
+    parser.add_argument("-blocksize", type=int, default=BLOCKSIZE_DEFAULT, help=f"Internal tile size of GeoTIFF tiles (default: {BLOCKSIZE_DEFAULT})")
+    parser.add_argument("-compress", choices=COMPRESSIONS, default=COMPRESS_DEFAULT, help=f"GeoTIFF tile compression (default: {COMPRESS_DEFAULT})")
     args = parser.parse_args()
-    
-    split_tif(args.image_path, args.output_dir, args.width, args.height, args.format)
+    if args.report:
+        instrument.enable(args.report, args.trace_memory)
+
+    encode_options = None
+    if args.format in IMAGE_FORMATS:
+        encode_options = dict(level=args.png_level, strategy=args.png_strategy, quality=args.quality)
+    options = dict(blocksize=args.blocksize, compress=args.compress, rgb_bands=args.rgb or (sensor_rgb(args.sensor) if args.sensor != SENSOR_DEFAULT else None), encode_options=encode_options,
+                   min_valid=args.min_valid, low_valid=args.low_valid)
+
+    image_paths = expand_inputs(args.image_path)
+    if len(image_paths) == 1 and os.path.isdir(image_paths[0]):
+        # finished images are recorded in the output directory, reruns only redo what changed
+        manifest = Manifest(os.path.join(args.output_dir, MANIFEST_NAME))
+        for filename in sorted(os.listdir(image_paths[0])):
+            if filename.endswith(".tif") or filename.endswith(".tiff"):
+                mask_path = None
+                if args.mask:
+                    mask_path = find_mask(filename, args.mask)
+                    if mask_path is None:
+                        print(f"⚠️ Skipping {filename}, it has no mask in {args.mask}")
+                        continue
+                print(f"📌 Processing: {filename}")
+                split_raster(os.path.join(image_paths[0], filename), os.path.join(args.output_dir, os.path.splitext(filename)[0]),
+                             args.width, args.height, args.format, args.overlap, args.edge, args.bands, args.name, args.workers,
+                             manifest=manifest, force=args.force, mask_path=mask_path, **options)
+    else:
+        # one tile grid over all scenes, continuous across their seams
+        with open_mosaic(image_paths) as image_path:
+            split_raster(image_path, args.output_dir, args.width, args.height, args.format, args.overlap, args.edge,
+                         args.bands, args.name, args.workers, mask_path=args.mask, **options)
+    print("✅ Splitting completed!")
@@ -0,0 +1,165 @@
+"""Evaluates a grid of NDVI/NDWI/NDBI thresholds on one scene in a single pass.
+
+auto_label keeps an index pixel for its class when it is at or above the
+index's threshold percentile and its min-max normalized value is above the
+threshold, i.e. when it is >= max(percentile, min + t * (max - min)) (up to
+rounding right at the cutoff). So a candidate grid only ever splits each index
+at a handful of cutoffs: the scene is read once, each index pixel gets the
+number of cutoffs it passes, and one joint histogram of those (plus the
+reference class, when there is one) answers every threshold combination
+without touching the pixels again.
+
+    python threshold_sweep.py -i tif_2_rad.tif --ndvi 0.5:0.9:0.05 --ndwi 0.5,0.56,0.85 --ndbi 0.2:0.8:0.1 -r 2_mask/tif_2_rad_mm.tif
+"""
+import argparse
+import csv
+import itertools
+import numpy as np
+import rasterio
+
+from auto_label import BACKGROUND, NDBI_THRESHOLD, NDVI_THRESHOLD, NDWI_THRESHOLD, URBAN, VEGETATION, WATER, \
+    MASK_INDEX_NAMES, IndexStats, cached_indices, iter_windows, window_indices
+from index_cache import CACHE_DTYPES, CACHE_SIZE_DEFAULT, IndexCache
+from mask_stats import agreement
+from raster_io import preview_shape
+from show_label import class_labels, load_mask
+from spectral import SENSOR_BANDS, SENSOR_DEFAULT
+
+# the default rule table of auto_label.mask_rules, highest priority first
+SWEEP_ORDER = [("ndwi", WATER), ("ndbi", URBAN), ("ndvi", VEGETATION)]
+INDEX_ORDER = MASK_INDEX_NAMES
+TOP_DEFAULT = 10
+
+
+def parse_grid(text):
+    """Threshold candidates from 'start:stop:step' (stop included) or a comma separated list."""
+    if ":" in text:
+        start, stop, step = (float(v) for v in text.split(":"))
+        return [round(v, 10) for v in np.arange(start, stop + step / 2, step)]
+    return [float(v) for v in text.split(",")]
+
+
+def index_cutoffs(stats, i, thresholds):
+    """The lowest passing value of index i for every candidate threshold, inf if the index has NaNs."""
+    if stats.has_nan[i]:
+        # like auto_label, a NaN anywhere turns the whole normalized index into NaN
+        return np.full(len(thresholds), np.inf, dtype=stats.dtype)
+    dtype = stats.dtype.type
+    lo, hi = stats.mins[i], stats.maxs[i]
+    cutoffs = []
+    for t in thresholds:
+        percentile = dtype(stats.sketches[i].quantile(t))
+        # normalized > t, the first representable value above min + t * (max - min)
+        normalized = np.nextafter(dtype(lo + t * (hi - lo)), dtype(np.inf))
+        cutoffs.append(max(percentile, normalized))
+    return np.array(cutoffs, dtype=stats.dtype)
+
+
+def index_chunks(src, windows, cube=None, max_size=None, sensor=SENSOR_DEFAULT):
+    """(window or None, (ndvi, ndwi, ndbi)) pieces of the scene: windows at full resolution, or one decimated read."""
+    if max_size:
+        yield None, window_indices(src, sensor=sensor, out_shape=preview_shape(src, max_size))
+        return
+    for window in windows:
+        yield window, window_indices(src, window, cube, sensor)
+
+
+def sweep(image_path, grids, reference_path=None, window_size=None, max_size=None, cache=None, sensor=SENSOR_DEFAULT):
+    """One result dict (thresholds, class fractions and, with a reference, agreement) per threshold combination."""
+    with rasterio.open(image_path) as src:
+        windows = list(iter_windows(src, window_size))
+        # the cache holds full resolution indices, decimated sweeps read the scene
+        cube = cached_indices(src, image_path, cache, windows, sensor) if cache is not None and not max_size else None
+
+        # first pass: percentile sketch, min and max of every index
+        stats = IndexStats([0.0] * len(INDEX_ORDER))
+        for _, indices in index_chunks(src, windows, cube, max_size, sensor):
+            stats.update(indices)
+
+        edges = {}
+        for i, name in enumerate(INDEX_ORDER):
+            cutoffs = index_cutoffs(stats, i, grids[name])
+            edges[name] = (np.unique(cutoffs), cutoffs)
+
+        reference = load_mask(reference_path, max_size) if reference_path else None
+        num_classes = len(class_labels)
+        if reference is not None:
+            num_classes = max(num_classes, int(reference.max()) + 1)
+        # the joint histogram axes: passed cutoffs of ndwi, ndbi, ndvi, then the reference class
+        shape = tuple(edges[name][0].size + 1 for name, _ in SWEEP_ORDER) + (num_classes if reference is not None else 1,)
+        histogram = np.zeros(int(np.prod(shape)), dtype=np.int64)
+
+        # second pass: every pixel binned once
+        for window, indices in index_chunks(src, windows, cube, max_size, sensor):
+            indices = dict(zip(INDEX_ORDER, indices))
+            codes = np.zeros(indices["ndvi"].shape, dtype=np.int64)
+            for (name, _), size in zip(SWEEP_ORDER, shape):
+                codes *= size
+                # NaN compares as the largest value, but never passes
+                passed = np.searchsorted(edges[name][0], indices[name], side="right")
+                passed[np.isnan(indices[name])] = 0
+                codes += passed
+            if reference is not None:
+                truth = reference if window is None else reference[window.toslices()]
+                if truth.shape != codes.shape:
+                    raise ValueError(f"The reference mask is {reference.shape}, the scene read is {src.height}x{src.width}.")
+                codes = codes * shape[-1] + truth
+            histogram += np.bincount(codes.ravel(), minlength=histogram.size)
+    histogram = histogram.reshape(shape)
+
+    # position of every candidate's cutoff among the unique cutoffs of its index
+    levels = {name: np.searchsorted(unique, cutoffs) for name, (unique, cutoffs) in edges.items()}
+    # class of every joint histogram cell, per candidate: the first rule whose cutoff the cell passes
+    passed = np.meshgrid(*(np.arange(size) for size in shape[:3]), indexing="ij")
+    results = []
+    names = [name for name, _ in SWEEP_ORDER]
+    for choice in itertools.product(*(range(len(grids[name])) for name in names)):
+        label = np.full(shape[:3], BACKGROUND, dtype=np.int64)
+        for (name, class_id), axis, j in reversed(list(zip(SWEEP_ORDER, passed, choice))):
+            label[axis > levels[name][j]] = class_id
+        confusion = np.zeros((shape[-1], num_classes), dtype=np.int64)
+        for truth in range(shape[-1]):
+            confusion[truth] = np.bincount(label.ravel(), weights=histogram[..., truth].ravel(), minlength=num_classes)
+        counts = confusion.sum(axis=0)
+        result = {name: grids[name][j] for name, j in zip(names, choice)}
+        result.update({f"{class_labels[c].lower()}_fraction": counts[c] / counts.sum() for c in range(len(class_labels))})
+        if reference is not None:
+            scores = agreement(confusion)
+            result["accuracy"] = scores["accuracy"]
+            result["mean_iou"] = np.nanmean([np.nan if v is None else v for v in scores["iou"]])
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Class fractions (and agreement with a reference mask) for a grid of auto_label thresholds.")
+    parser.add_argument("-i", type=str, required=True, help="Path to the multi-band TIFF image.")
+    parser.add_argument("-o", type=str, default=None, help="CSV file for all results (default: only print the best ones).")
+    parser.add_argument("-r", "--reference", type=str, default=None, help="Reference mask (.tif/.png) of the same scene to score the candidates against.")
+    parser.add_argument("--ndvi", type=parse_grid, default=[NDVI_THRESHOLD], help="NDVI candidates, 'start:stop:step' or 'a,b,c'.")
+    parser.add_argument("--ndwi", type=parse_grid, default=[NDWI_THRESHOLD], help="NDWI candidates, 'start:stop:step' or 'a,b,c'.")
+    parser.add_argument("--ndbi", type=parse_grid, default=[NDBI_THRESHOLD], help="NDBI candidates, 'start:stop:step' or 'a,b,c'.")
+    parser.add_argument("--sensor", choices=list(SENSOR_BANDS), default=SENSOR_DEFAULT, help=f"Band layout of the image (default: {SENSOR_DEFAULT}).")
+    parser.add_argument("--window", type=int, default=0, help="Window size in pixels (default: the raster's internal blocks).")
+    parser.add_argument("--max-size", type=int, default=0, help="Sweep on a decimated read with this longest side, 0 for full resolution (default).")
+    parser.add_argument("--cache", type=str, default=None, help="Index cache directory shared with auto_label.py --cache.")
+    parser.add_argument("--cache-size", type=float, default=CACHE_SIZE_DEFAULT / 2**30, help=f"Size cap of the --cache in GiB (default: {CACHE_SIZE_DEFAULT / 2**30:g}).")
+    parser.add_argument("--cache-dtype", choices=CACHE_DTYPES, default=CACHE_DTYPES[0], help="Storage type of the cached indices (default: float32).")
+    parser.add_argument("--top", type=int, default=TOP_DEFAULT, help=f"Number of results to print (default: {TOP_DEFAULT}).")
+    args = parser.parse_args()
+
+    grids = {"ndvi": args.ndvi, "ndwi": args.ndwi, "ndbi": args.ndbi}
+    cache = IndexCache(args.cache, int(args.cache_size * 2**30), args.cache_dtype) if args.cache else None
+    results = sweep(args.i, grids, args.reference, args.window, args.max_size, cache, args.sensor)
+    if args.reference:
+        results.sort(key=lambda result: result["accuracy"] or 0, reverse=True)
+
+    if args.o:
+        with open(args.o, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"✅ Saved {len(results)} results: {args.o}")
+
+    for result in results[:args.top]:
+        print(", ".join(f"{key} {value:.4g}" for key, value in result.items()))
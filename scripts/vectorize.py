@@ -0,0 +1,221 @@
+"""Per class polygons of a class mask, as GeoJSON or GeoPackage.
+
+The mask is cut into windows that are polygonized (rasterio.features.shapes)
+in a process pool. Polygons are traced in whole pixel coordinates, so pieces
+of a region that meet at a window seam share their edges exactly and no
+overlap between windows is needed: pieces touching a seam are grouped with
+the pieces they touch and every group is dissolved (in the pool again), all
+other polygons are final as they are.
+Polygons are then put on the mask's grid and optionally simplified (with
+shapely, in map units; neighbouring classes may no longer share boundaries).
+
+shapely is optional: without it the whole mask is polygonized in one piece,
+which gives the same polygons on a single core. GeoPackage output needs fiona.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.features import shapes
+from rasterio.windows import Window
+from tqdm import tqdm
+
+from manifest import atomic_path
+from mask_io import read_mask
+from show_label import class_labels
+
+try:
+    import shapely
+    from shapely.affinity import affine_transform
+    from shapely.geometry import mapping, shape
+except ImportError:
+    shapely = None
+try:
+    import fiona
+except ImportError:
+    fiona = None
+
+# background is not vectorized
+CLASSES_DEFAULT = [1, 2, 3]
+WINDOW_DEFAULT = 1024
+WORKERS_DEFAULT = min(8, os.cpu_count() or 1)
+VECTOR_FORMATS = {".geojson": "GeoJSON", ".json": "GeoJSON", ".gpkg": "GPKG"}
+
+# the mask of the worker process, see _init_worker
+_mask = None
+
+
+def _init_worker(mask_path, mask):
+    global _mask
+    _mask = rasterio.open(mask_path) if mask is None else mask
+
+
+def _read(window):
+    if isinstance(_mask, np.ndarray):
+        return _mask[window.toslices()]
+    return _mask.read(1, window=window)
+
+
+def to_map(polygon, transform, simplify=0.0):
+    """GeoJSON-like mapping of a polygon in pixel coordinates (GeoJSON-like or shapely) on the grid of transform."""
+    if shapely is None:
+        return {"type": "Polygon", "coordinates": [[transform * point for point in ring] for ring in polygon["coordinates"]]}
+    polygon = shape(polygon) if isinstance(polygon, dict) else polygon
+    polygon = affine_transform(polygon, [transform.a, transform.b, transform.d, transform.e, transform.c, transform.f])
+    if simplify:
+        polygon = polygon.simplify(simplify, preserve_topology=True)
+    return mapping(polygon)
+
+
+def _window_polygons(job):
+    """(final polygons, seam pieces) of one window, as (class, geometry).
+
+    Final polygons are GeoJSON-like in map coordinates, the pieces touching a
+    seam stay in pixel coordinates (as WKB) for the union.
+    """
+    window, classes, width, height, transform, simplify = job
+    data = _read(window)
+    seams = (window.col_off > 0, window.row_off > 0, window.col_off + window.width < width, window.row_off + window.height < height)
+    final, pieces = [], []
+    for geometry, value in shapes(data, mask=np.isin(data, classes), transform=Affine.translation(window.col_off, window.row_off)):
+        if shapely is not None:
+            polygon = shape(geometry)
+            left, top, right, bottom = polygon.bounds
+            edges = (left == window.col_off, top == window.row_off,
+                     right == window.col_off + window.width, bottom == window.row_off + window.height)
+            if any(seam and edge for seam, edge in zip(seams, edges)):
+                pieces.append((int(value), shapely.to_wkb(polygon)))
+                continue
+            geometry = polygon
+        final.append((int(value), to_map(geometry, transform, simplify)))
+    return final, pieces
+
+
+def seam_groups(wkbs):
+    """The seam pieces (WKB) split into groups of pieces that touch, directly or through others."""
+    parts = shapely.from_wkb(wkbs)
+    parent = list(range(len(parts)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in shapely.STRtree(parts).query(parts, predicate="intersects").T:
+        parent[root(i)] = root(j)
+    groups = {}
+    for i, wkb in enumerate(wkbs):
+        groups.setdefault(root(i), []).append(wkb)
+    return list(groups.values())
+
+
+def _dissolve(job):
+    """(class, GeoJSON-like polygons in map coordinates) of one group of seam pieces."""
+    value, wkbs, transform, simplify = job
+    merged = shapely.unary_union(shapely.from_wkb(wkbs))
+    return value, [to_map(polygon, transform, simplify) for polygon in shapely.get_parts(merged)]
+
+
+def mask_windows(width, height, window_size):
+    for row in range(0, height, window_size):
+        for col in range(0, width, window_size):
+            yield Window(col, row, min(window_size, width - col), min(window_size, height - row))
+
+
+def polygonize(mask_path, classes=CLASSES_DEFAULT, like=None, window_size=WINDOW_DEFAULT, workers=WORKERS_DEFAULT, simplify=0.0):
+    """Yields (class, GeoJSON-like polygon in map coordinates) of every region of the given classes.
+
+    GeoTIFF masks are read window by window in the workers, other masks (see
+    mask_io.read_mask) are read whole and placed on the grid of `like`.
+    Returns the CRS through the generator's first item: (None, crs).
+    """
+    georeferenced = os.path.splitext(mask_path)[1].lower() in (".tif", ".tiff")
+    with rasterio.open(mask_path if georeferenced else like) as grid:
+        transform, crs, width, height = grid.transform, grid.crs, grid.width, grid.height
+    mask = None
+    if not georeferenced:
+        if like is None:
+            raise ValueError(f"{mask_path} has no georeferencing, give the image it was made from as `like`.")
+        mask = read_mask(mask_path)
+        if mask.shape != (height, width):
+            raise ValueError(f"The mask is {mask.shape[1]}x{mask.shape[0]}, {like} is {width}x{height}.")
+    if simplify and shapely is None:
+        raise ImportError("Simplifying polygons needs shapely.")
+    if shapely is None:
+        print("⚠️ shapely is not installed, polygonizing the whole mask on one core.")
+        window_size, workers = max(width, height), 1
+    yield None, crs
+
+    windows = list(mask_windows(width, height, window_size))
+    jobs = [(window, list(classes), width, height, transform, simplify) for window in windows]
+    pieces = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mask_path, mask)) as executor:
+        for final, seam_pieces in tqdm(executor.map(_window_polygons, jobs), total=len(jobs), desc="Vectorizing windows", unit="window"):
+            yield from final
+            for value, wkb in seam_pieces:
+                pieces.setdefault(value, []).append(wkb)
+
+        # regions cut by the window seams: touching pieces are dissolved together,
+        # pixel coordinates make their shared edges exact
+        jobs = [(value, group, transform, simplify) for value, wkbs in pieces.items() for group in seam_groups(wkbs)]
+        for value, polygons in executor.map(_dissolve, jobs, chunksize=16):
+            for polygon in polygons:
+                yield value, polygon
+
+
+def write_vectors(features, path, crs):
+    """Writes (class, polygon) features to a GeoJSON or GeoPackage file, returns the feature count."""
+    driver = VECTOR_FORMATS.get(os.path.splitext(path)[1].lower())
+    if driver is None:
+        raise ValueError(f"Unsupported vector format: {path}, use one of {list(VECTOR_FORMATS)}.")
+    if driver == "GPKG" and fiona is None:
+        raise ImportError("GeoPackage output needs fiona, write .geojson instead.")
+    names = lambda value: class_labels[value] if value < len(class_labels) else f"Class {value}"
+    count = 0
+    with atomic_path(path) as tmp:
+        if driver == "GeoJSON":
+            with open(tmp, "w") as f:
+                # coordinates stay in the mask CRS, named the pre-RFC 7946 way most GIS tools read
+                header = {"type": "FeatureCollection"}
+                if crs is not None:
+                    header["crs"] = {"type": "name", "properties": {"name": crs.to_string()}}
+                f.write(json.dumps(header)[:-1] + ', "features": [\n')
+                for value, geometry in features:
+                    feature = {"type": "Feature", "properties": {"class": value, "name": names(value)}, "geometry": geometry}
+                    f.write((",\n" if count else "") + json.dumps(feature))
+                    count += 1
+                f.write("\n]}\n")
+        else:
+            schema = {"geometry": "Polygon", "properties": {"class": "int", "name": "str"}}
+            with fiona.open(tmp, "w", driver=driver, schema=schema, crs_wkt=crs.to_wkt() if crs else None) as dst:
+                for value, geometry in features:
+                    dst.write({"geometry": geometry, "properties": {"class": value, "name": names(value)}})
+                    count += 1
+    return count
+
+
+def vectorize(mask_path, output_path, classes=CLASSES_DEFAULT, like=None, window_size=WINDOW_DEFAULT, workers=WORKERS_DEFAULT, simplify=0.0):
+    """Polygonizes a class mask into output_path (.geojson or .gpkg), returns the number of polygons."""
+    features = polygonize(mask_path, classes, like, window_size, workers, simplify)
+    _, crs = next(features)
+    count = write_vectors(features, output_path, crs)
+    print(f"✅ Saved {count} polygons: {output_path}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Polygonize a class mask into per class polygons.")
+    parser.add_argument("mask_path", help="Class mask (.tif, or .png/.npy with --like).")
+    parser.add_argument("-o", "--output", required=True, help=f"Output file, one of {', '.join(VECTOR_FORMATS)}.")
+    parser.add_argument("--like", default=None, help="Image on the grid of a .png/.npy mask, for its georeferencing.")
+    parser.add_argument("--classes", type=int, nargs="+", default=CLASSES_DEFAULT, help=f"Class values to vectorize (default: {' '.join(map(str, CLASSES_DEFAULT))}).")
+    parser.add_argument("--window", type=int, default=WINDOW_DEFAULT, help=f"Window size in pixels (default: {WINDOW_DEFAULT}).")
+    parser.add_argument("--workers", type=int, default=WORKERS_DEFAULT, help=f"Worker processes (default: {WORKERS_DEFAULT}).")
+    parser.add_argument("--simplify", type=float, default=0.0, help="Simplification tolerance in map units, 0 keeps the pixel edges (default: 0).")
+    args = parser.parse_args()
+
+    vectorize(args.mask_path, args.output, args.classes, args.like, args.window, args.workers, args.simplify)
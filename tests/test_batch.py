@@ -0,0 +1,37 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from auto_label import NDBI_THRESHOLD, NDVI_THRESHOLD, NDWI_THRESHOLD, mask_filename, process_batch
+
+
+def write_scene(path, seed):
+    rng = np.random.default_rng(seed)
+    data = rng.uniform(1, 100, (7, 48, 64)).astype(np.float32)
+    profile = dict(driver="GTiff", width=64, height=48, count=7, dtype="float32", crs="EPSG:32633", transform=from_origin(0, 0, 30, 30))
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+
+
+def test_failing_scene_does_not_stop_the_pool(tmp_path, capsys):
+    paths = [str(tmp_path / f"scene_{i}.tif") for i in range(4)]
+    for i, path in enumerate(paths):
+        write_scene(path, i)
+    with open(paths[1], "wb") as f:
+        f.write(b"not a tiff")
+    output_dir = tmp_path / "masks"
+    output_dir.mkdir()
+
+    errors = process_batch(paths, str(output_dir), NDVI_THRESHOLD, NDWI_THRESHOLD, NDBI_THRESHOLD, workers=2, stream=True)
+
+    # one result per scene, in input order whatever order the workers finish in
+    assert len(errors) == len(paths)
+    assert errors[1] is not None and "scene_1.tif" in errors[1]
+    assert [error is None for error in errors] == [True, False, True, True]
+    for i in (0, 2, 3):
+        with rasterio.open(mask_filename(paths[i], str(output_dir), "tif")) as mask:
+            assert mask.shape == (48, 64)
+            assert set(np.unique(mask.read(1))) <= {0, 1, 2, 3}
+    assert not (output_dir / "scene_1_mm.tif").exists()
+    report = capsys.readouterr().out
+    assert f"Failed {paths[1]}" in report and "Labeled 3/4 images" in report
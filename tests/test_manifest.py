@@ -0,0 +1,60 @@
+import os
+
+from manifest import Manifest, atomic_path
+
+PARAMS = {"tile_width": 256, "format": "tif"}
+
+
+def finished(tmp_path):
+    """A manifest recording input.tif -> output.tif, saved and reloaded."""
+    source, output = tmp_path / "input.tif", tmp_path / "output.tif"
+    source.write_bytes(b"scene")
+    output.write_bytes(b"tiles")
+    Manifest(str(tmp_path / "manifest.json")).record(str(source), PARAMS, [str(output)])
+    return Manifest(str(tmp_path / "manifest.json")), str(source), str(output)
+
+
+def test_unchanged_input_is_current(tmp_path):
+    manifest, source, output = finished(tmp_path)
+    assert manifest.is_current(source, dict(PARAMS))
+    assert manifest.outputs(source) == [os.path.abspath(output)]
+
+
+def test_changed_params_invalidate(tmp_path):
+    manifest, source, _ = finished(tmp_path)
+    assert not manifest.is_current(source, dict(PARAMS, tile_width=512))
+
+
+def test_changed_content_invalidates(tmp_path):
+    manifest, source, _ = finished(tmp_path)
+    with open(source, "wb") as f:
+        f.write(b"other")
+    assert not manifest.is_current(source, PARAMS)
+
+
+def test_touched_input_with_same_content_is_current(tmp_path):
+    manifest, source, _ = finished(tmp_path)
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert manifest.is_current(source, PARAMS)
+
+
+def test_missing_or_changed_output_invalidates(tmp_path):
+    manifest, source, output = finished(tmp_path)
+    with open(output, "wb") as f:
+        f.write(b"truncated tiles")
+    assert not manifest.is_current(source, PARAMS)
+    os.remove(output)
+    assert not manifest.is_current(source, PARAMS)
+
+
+def test_atomic_path_leaves_nothing_on_error(tmp_path):
+    target = tmp_path / "out.json"
+    try:
+        with atomic_path(str(target)) as tmp:
+            with open(tmp, "w") as f:
+                f.write("partial")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from mask_io import mask_bits, pack_mask, read_mask, unpack_mask, write_mask
+
+
+def mask(classes=4, shape=(37, 53)):
+    return np.random.default_rng(0).integers(0, classes, shape).astype(np.uint8)
+
+
+@pytest.mark.parametrize("classes,bits", [(2, 1), (4, 2), (16, 4), (200, 8)])
+def test_pack_unpack_round_trip(classes, bits):
+    original = mask(classes)
+    assert mask_bits(original) == bits
+    packed = pack_mask(original)
+    # widths that are not a multiple of the pixels per byte are padded
+    assert packed.shape == (original.shape[0], -(-original.shape[1] * bits // 8))
+    np.testing.assert_array_equal(unpack_mask(packed, bits, original.shape[1]), original)
+
+
+@pytest.mark.parametrize("ext", ["png", "npy"])
+def test_write_read_round_trip(tmp_path, ext):
+    original = mask()
+    path = write_mask(original, str(tmp_path / f"mask.{ext}"))
+    restored = read_mask(path)
+    assert restored.dtype == np.uint8
+    np.testing.assert_array_equal(restored, original)
+
+
+@pytest.mark.parametrize("ext", ["png", "npy"])
+def test_decimated_read_keeps_class_values(tmp_path, ext):
+    original = mask(shape=(100, 60))
+    path = write_mask(original, str(tmp_path / f"mask.{ext}"))
+    np.testing.assert_array_equal(read_mask(path, max_size=50), original[::2, ::2])
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from rules import Rule, classify
+
+
+def legacy_mask(ndvi, ndwi, ndbi, ndvi_t, ndwi_t, ndbi_t):
+    """auto_label.py's multiclass mask before rule tables."""
+    mask = np.zeros_like(ndvi, dtype=np.uint8)
+    mask[ndvi > ndvi_t] = 1
+    mask[ndbi > ndbi_t] = 3
+    mask[ndwi > ndwi_t] = 2
+    return mask
+
+
+def test_default_table_matches_legacy_mask():
+    rng = np.random.default_rng(0)
+    ndvi, ndwi, ndbi = rng.random((3, 300, 200)).astype(np.float32)
+    rules = [Rule(2, "ndwi", ">", 0.56), Rule(3, "ndbi", ">", 0.5), Rule(1, "ndvi", ">", 0.6)]
+    mask = classify(dict(ndvi=ndvi, ndwi=ndwi, ndbi=ndbi), rules, chunk_pixels=1000)
+    np.testing.assert_array_equal(mask, legacy_mask(ndvi, ndwi, ndbi, 0.6, 0.56, 0.5))
+
+
+def test_unknown_comparator_and_index():
+    indices = {"ndvi": np.zeros((2, 2))}
+    with pytest.raises(ValueError):
+        classify(indices, [Rule(1, "ndvi", "=>", 0.5)])
+    with pytest.raises(ValueError):
+        classify(indices, [Rule(1, "ndwi", ">", 0.5)])
@@ -0,0 +1,51 @@
+import json
+import tarfile
+
+import numpy as np
+from affine import Affine
+from rasterio.crs import CRS
+
+from shards import ShardReader, ShardWriter
+
+
+def test_offset_reads_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    tiles = [rng.integers(0, 1000, (3, 16 + k, 20)).astype(np.uint16) for k in range(12)]
+    crs = CRS.from_epsg(32633)
+    # small shards, so tiles are spread over several of them
+    with ShardWriter(str(tmp_path), prefix="scene", max_shard_bytes=8000) as writer:
+        for k, tile in enumerate(tiles):
+            writer.write(f"tile_{k}", tile, Affine(30, 0, 500000 + 30 * k, 0, -30, 4000000), crs, "scene")
+
+    reader = ShardReader(writer.index_path)
+    try:
+        assert len(reader) == len(tiles)
+        assert len({entry["shard"] for entry in reader.tiles}) > 1
+        for k, tile in enumerate(tiles):
+            np.testing.assert_array_equal(reader[k], tile)
+            transform, tile_crs, scene = reader.georeference(k)
+            assert transform.c == 500000 + 30 * k and tile_crs == crs and scene == "scene"
+    finally:
+        reader.close()
+
+
+def test_shards_are_plain_tar_files(tmp_path):
+    tile = np.arange(12, dtype=np.float32).reshape(1, 3, 4)
+    with ShardWriter(str(tmp_path)) as writer:
+        writer.write("a", tile, Affine.identity(), None, "scene")
+    with open(writer.index_path) as f:
+        entry = json.load(f)["tiles"][0]
+    with tarfile.open(tmp_path / entry["shard"]) as tar:
+        assert tar.getnames() == ["scene/a.npy"]
+
+
+def test_scenes_sharing_a_writer_keep_their_tiles_apart(tmp_path):
+    with ShardWriter(str(tmp_path)) as writer:
+        for value, scene in enumerate(["scene_a", "scene_b"]):
+            writer.write("tile_0_0", np.full((1, 2, 2), value, np.uint8), Affine.identity(), None, scene)
+    reader = ShardReader(writer.index_path)
+    try:
+        assert [entry["key"] for entry in reader.tiles] == ["scene_a/tile_0_0", "scene_b/tile_0_0"]
+        assert [int(reader[k][0, 0, 0]) for k in range(2)] == [0, 1]
+    finally:
+        reader.close()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from sketch import QuantileSketch
+
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+@pytest.mark.parametrize("accuracy", [1e-2, 1e-3])
+def test_relative_error_within_accuracy(accuracy):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.lognormal(0, 2, 50_000), -rng.lognormal(1, 1, 20_000), np.zeros(5_000)])
+    sketch = QuantileSketch(accuracy).update(values)
+    for q in QUANTILES:
+        exact = np.quantile(values, q, method="lower")
+        assert abs(sketch.quantile(q) - exact) <= accuracy * abs(exact) + 1e-12
+
+
+def test_merge_equals_single_sketch():
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 10, 100_000)
+    single = QuantileSketch().update(values)
+    merged = QuantileSketch()
+    for part in np.array_split(values, 7):
+        merged.merge(QuantileSketch().update(part))
+    assert merged.count == single.count
+    assert (merged.min, merged.max) == (single.min, single.max)
+    assert merged.quantile(QUANTILES) == single.quantile(QUANTILES)
+
+
+def test_ignores_non_finite_values():
+    sketch = QuantileSketch().update(np.array([1.0, np.nan, np.inf, -np.inf, 2.0]))
+    assert sketch.count == 2
+
+
+def test_merge_needs_same_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(1e-2).merge(QuantileSketch(1e-3))
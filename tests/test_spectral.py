@@ -0,0 +1,57 @@
+import numpy as np
+
+from spectral import LANDSAT8_BANDS, IndexPlan, compute_indices
+
+
+def legacy_indices(image):
+    """The float32 formulas auto_label.py used before the index engine."""
+    blue, green, red, nir, swir1 = image[1], image[2], image[3], image[4], image[5]
+    epsilon = 1e-6
+    ndbi = (swir1 - nir) / (swir1 + nir + epsilon)
+    ndvi_e = (nir - red) / (nir + red + epsilon)
+    mndwi = (green - swir1) / (green + swir1 + epsilon)
+    return {
+        "ndvi": (nir - red) / (nir + red),
+        "ndwi": (green - swir1) / (green + swir1),
+        "ndbi": ndbi,
+        "ui": ((swir1 + red) - (nir + blue)) / ((swir1 + red) + (nir + blue) + epsilon),
+        "ibi": (ndbi - (ndvi_e + mndwi)) / (ndbi + (ndvi_e + mndwi) + epsilon),
+    }
+
+
+def scene(dtype=np.uint16):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 20_000, (7, 64, 80)).astype(dtype)
+    image[:, :4] = 0  # zero fill, 0 / 0 for the epsilon-free ratios
+    return image
+
+
+def test_matches_legacy_formulas():
+    image = scene()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        legacy = legacy_indices(image.astype(np.float32))
+        # small chunks, so the chunked evaluation is exercised too
+        indices = compute_indices(image, list(legacy), chunk_rows=5)
+    for name, expected in legacy.items():
+        assert indices[name].dtype == np.float32
+        np.testing.assert_array_equal(indices[name], expected, err_msg=name)
+
+
+def test_no_uint16_wrap_around():
+    image = scene()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ndvi = compute_indices(image, ["ndvi"])["ndvi"]
+    valid = ~np.isnan(ndvi)
+    assert ndvi[valid].min() >= -1 and ndvi[valid].max() <= 1
+
+
+def test_compact_plan_reads_only_used_bands():
+    image = scene(np.float32)
+    plan = IndexPlan(["ndvi", "ndwi", "ndbi"], LANDSAT8_BANDS)
+    indexes, compact = plan.compact()
+    assert len(indexes) == 4
+    with np.errstate(divide="ignore", invalid="ignore"):
+        full = plan.evaluate(image)
+        subset = compact.evaluate(image[[i - 1 for i in indexes]])
+    for name in plan.names:
+        np.testing.assert_array_equal(subset[name], full[name])
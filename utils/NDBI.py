@@ -1,8 +1,16 @@
 import os
+import sys
 import rasterio
 import numpy as np
 from PIL import Image
 
+# the index engine lives next to the other scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from spectral import compute_indices
+
+# plain ratio, the engine's named "ndbi" adds an epsilon to the denominator
+NDBI_EXPRESSION = "(swir1 - nir) / (swir1 + nir)"
+
 ## to get urben areas
 
 
@@ -16,12 +24,11 @@ def compute_ndbi(image_path):
     with rasterio.open(image_path) as dataset:
         img_name = os.path.splitext(os.path.basename(image_path))[0]
         
-        # Read SWIR (Band 6) and NIR (Band 5)
-        swir = dataset.read(6).astype(np.float32)
-        nir = dataset.read(5).astype(np.float32)
+        # Read NIR (Band 5) and SWIR (Band 6)
+        bands = dataset.read([5, 6])
 
         # Compute NDBI
-        ndbi = (swir - nir) / (swir + nir)  # Avoid division by zero
+        ndbi = compute_indices(bands, [NDBI_EXPRESSION], bands={"nir": 0, "swir1": 1})[NDBI_EXPRESSION]
 
         # Normalize to 0-255 for PNG saving
         ndbi = ((ndbi + 1) / 2 * 255).astype(np.uint8)
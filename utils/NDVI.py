@@ -1,8 +1,13 @@
 import os
+import sys
 import rasterio
 import numpy as np
 from PIL import Image
 
+# the index engine lives next to the other scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from spectral import compute_indices
+
 ## to get farms like ndvi
 
 
@@ -16,12 +21,11 @@ def compute_evi(image_path):
     with rasterio.open(image_path) as dataset:
         img_name = os.path.splitext(os.path.basename(image_path))[0]
 
-        # Read NIR (Band 5), Red (Band 4), and Blue (Band 2)
-        nir = dataset.read(5).astype(np.float32)
-        red = dataset.read(4).astype(np.float32)
+        # Read Red (Band 4) and NIR (Band 5)
+        bands = dataset.read([4, 5])
 
-        # Compute EVI
-        ndvi =((nir - red) / (nir + red))
+        # Compute NDVI
+        ndvi = compute_indices(bands, ["ndvi"], bands={"red": 0, "nir": 1})["ndvi"]
 
         # Normalize to 0-255
         ndvi = ((ndvi + 1) / 2 * 255).astype(np.uint8)
@@ -1,8 +1,13 @@
 import os
+import sys
 import rasterio
 import numpy as np
 from PIL import Image
 
+# the index engine lives next to the other scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from spectral import compute_indices
+
 ## to get water surfaces
 
 
@@ -17,11 +22,11 @@ def compute_ndwi(image_path):
         img_name = os.path.splitext(os.path.basename(image_path))[0]
 
         # Read Green (Band 3) and NIR (Band 5)
-        green = dataset.read(3).astype(np.float32)
-        nir = dataset.read(5).astype(np.float32)
+        bands = dataset.read([3, 5])
 
-        # Compute NDWI
-        ndwi = (green - nir) / (green + nir + 1e-10)
+        # Compute NDWI (McFeeters, green and NIR)
+        expression = "(green - nir) / (green + nir + 1e-10)"
+        ndwi = compute_indices(bands, [expression], bands={"green": 0, "nir": 1})[expression]
 
         # Normalize to 0-255
         ndwi = ((ndwi + 1) / 2 * 255).astype(np.uint8)